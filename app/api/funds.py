@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Query
 from typing import List
-from qdrant_client.models import PointStruct
 import requests
 import traceback
 import json
 
 from app.models.instrumento import Instrumento
-from app.services.qdrant_store import upsert_points
-from app.services.qdrant_store import search_all_points
+from app.services.qdrant_store import SEMANTIC, TOPIC
+from app.services.bulk_writer import bulk_index
+from app.utils.streaming import stream_collection
 from app.services.embeddings_factory import get_embeddings_provider
 
 router = APIRouter(prefix="/funds", tags=["funds"])
@@ -28,51 +28,43 @@ def _text_of_fund_dict(p: dict) -> str:
         p["TipoDePerfil"]
     ]))
 
+# Vectores semantico y de topicos (de la descripcion) de un lote de fondos
+def _fund_vectors(provider, topics):
+    async def embed(batch: List[dict]) -> dict:
+        vectors = await provider.embed_array(list(map(_text_of_fund_dict, batch)))
+        topicos = await topics.vectors([f['Descripcion'] for f in batch])
+        return {SEMANTIC: vectors, TOPIC: topicos}
+    return embed
+
 # Sube y vectoriza los instrumentos vigentes y historicos desde el BackEnd
-async def subir_instrumentos_de_core(provider, topic_model):
+async def subir_instrumentos_de_core(provider, topics, collection: str = "funds"):
     fondos = []
     with open('instrumentos.json') as json_data:
         fondos = json.load(json_data)
-    texts = list(map(_text_of_fund_dict, fondos)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for f, vec in zip(fondos, vectors):
+    payloads = []
+    for f in fondos:
         payload = f.copy()
         payload.setdefault("Estado", f['Estado'])
-        _, probs = topic_model.transform(f['Descripcion'])
-        topicos = probs[0][1:]
-        punto = PointStruct(id=int(f["ID"]), vector=topicos, payload=payload)
-        lista_topic.append(punto)
-        points.append(PointStruct(id=int(f["ID"]), vector=vec, payload=payload))
-    upsert_points("funds_topics", lista_topic)
-    upsert_points("funds", points)
+        payloads.append(payload)
+    ids = [int(f["ID"]) for f in fondos]
+    await bulk_index(collection, ids, payloads, _fund_vectors(provider, topics))
 
 # Muestra todos los instrumentos vectorizados
 @router.get("/all", summary="Obtener todos los instrumentos indexados")
-async def get_all_funds(request: Request) -> dict:
-    results, _ = search_all_points("funds")
-    fondos = [item.payload for item in results]
-    return {"funds": fondos}
+async def get_all_funds(request: Request, cursor: str | None = None, limit: int | None = Query(None, ge=1)):
+    return stream_collection("funds", "funds", cursor, limit)
 
 # Sube y vectoriza un fondo subido por el usuario
 @router.post("/upsert", summary="Agregar e indexar un solo fondo")
 async def upsert_funds(items: List[Instrumento], request: Request) -> dict:
     provider = request.app.state.provider
-    texts = list(map(_text_of_fund, items)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for i, vec in zip(items, vectors):
+    payloads = []
+    for i in items:
         payload = i.model_dump()
         payload.setdefault("Estado", i.Estado)
-        topics, probs = request.app.state.topic_model.transform(i.Descripcion)
-        topicos = probs[0][1:]
-        punto = PointStruct(id=int(i.ID), vector=topicos, payload=payload)
-        lista_topic.append(punto)
-        points.append(PointStruct(id=int(i.ID), vector=vec, payload=payload))
-    upsert_points("funds_topics", lista_topic)
-    upsert_points("funds", points)
-    return {"upserted": len(points)}
+        payloads.append(payload)
+    ids = [int(i.ID) for i in items]
+    await bulk_index("funds", ids, payloads, _fund_vectors(provider, request.app.state.topics))
+    return {"upserted": len(payloads)}
 
 
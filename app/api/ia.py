@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Request
-from qdrant_client.models import PointStruct
 from app.models.idea import Idea
 from app.models.idea_processed import IdeaProcessed
-from app.services.qdrant_store import upsert_points
+from app.services.qdrant_store import aupsert_vectors
+from app.services.qdrant_store import SEMANTIC, TOPIC
 
 router = APIRouter(prefix="/ia", tags=["ia"])
 
@@ -10,21 +10,24 @@ router = APIRouter(prefix="/ia", tags=["ia"])
 async def process_idea(idea: Idea, request: Request) -> IdeaProcessed:
     provider = request.app.state.provider
     text = f"{idea.Campo}. {idea.Problema}. {idea.Publico}. {idea.Innovacion}."
-    [embedding] = await provider.embed([text])
-
-    point = PointStruct(
-        id=int(idea.ID),
-        vector=embedding,
-        payload={
-            "ID": idea.ID,
-            "Usuario": idea.Usuario,
-            "Campo": idea.Campo,
-            "Publico": idea.Publico,
-            "Problema": idea.Problema,
-            "Innovacion": idea.Innovacion,
-        }
+    vectors = await provider.embed_array([text])
+    # Sin resumen LLM, los topicos se infieren del mismo texto
+    topics = request.app.state.topics
+    topics.invalidate(("ideas", idea.ID))
+    topico = await topics.vector(
+        text,
+        owner=("ideas", idea.ID),
+        embedding=vectors[0] if topics.shares_encoder(provider) else None,
     )
-    upsert_points("ideas", [point])
+
+    await aupsert_vectors("ideas", [int(idea.ID)], {SEMANTIC: vectors, TOPIC: topico[None, :]}, [{
+        "ID": idea.ID,
+        "Usuario": idea.Usuario,
+        "Campo": idea.Campo,
+        "Publico": idea.Publico,
+        "Problema": idea.Problema,
+        "Innovacion": idea.Innovacion,
+    }])
 
     return IdeaProcessed(
         ID=idea.ID,
@@ -33,5 +36,6 @@ async def process_idea(idea: Idea, request: Request) -> IdeaProcessed:
         Problema=idea.Problema.strip(),
         Publico=idea.Publico.strip(),
         Innovacion=idea.Innovacion.strip(),
-        Embedding=embedding,
+        # Solo aqui, en el borde HTTP, se pasa a lista de floats
+        Embedding=vectors[0].tolist(),
     )
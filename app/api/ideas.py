@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, Query
 from qdrant_client.models import PointStruct
 import requests
 import json
@@ -6,8 +6,10 @@ import json
 from app.models.idea import Idea
 from app.models.instrumento import Instrumento
 from app.models.idea_refinada import IdeaRefinada
-from app.services.qdrant_store import upsert_points
-from app.services.qdrant_store import search_all_points
+from app.services.qdrant_store import aupsert_vectors
+from app.services.qdrant_store import SEMANTIC, TOPIC
+from app.services.bulk_writer import bulk_index
+from app.utils.streaming import stream_collection
 from app.utils.llm_ollama import llm_generate
 
 router = APIRouter(prefix="/ideas", tags=["ideas"])
@@ -28,32 +30,41 @@ Sigue las siguientes instrucciones
 4. No digas explicitamente "factor diferenciador", usa modos del habla distintos como "de distingue las alternativas del mercado haciendo---" tampoco menciones directamente a CORFO y ANID
 """.strip()
 
+# Textualiza los campos de una idea en formato de diccionario
+def _text_of_idea_dict(idea: dict) -> str:
+    return f"{idea.get('Campo')}. {idea.get('Problema')}. {idea.get('Publico')}. {idea.get('Innovacion')}."
+
+# Texto del que se infieren los topicos de una idea: el resumen del LLM si existe
+def _topic_text_of_idea(idea: dict) -> str:
+    return idea.get("ResumenLLM") or _text_of_idea_dict(idea)
+
+# Vectores semantico y de topicos de un lote de ideas
+def _idea_vectors(provider, topics):
+    async def embed(batch: list) -> dict:
+        vectors = await provider.embed_array(list(map(_text_of_idea_dict, batch)))
+        topicos = await topics.vectors(list(map(_topic_text_of_idea, batch)))
+        return {SEMANTIC: vectors, TOPIC: topicos}
+    return embed
+
 # Sube y vectoriza las ideas de usuarios desde el BackEnd
-async def subir_ideas_del_backend(provider):
+# Guarda el vector semantico y el de topicos en el mismo punto
+async def subir_ideas_del_backend(provider, topics, collection: str = "ideas"):
     ideas = []
     with open('ideas.json') as json_data:
         ideas = json.load(json_data)
-    puntos = []
     for i in range(len(ideas)):
         ideas[i]["ResumenLLM"] = ideas[i].pop("Propuesta")
-    for idea in ideas:
-        paragraph = f"{idea["Campo"]}. {idea["Problema"]}. {idea["Publico"]}. {idea["Innovacion"]}."
-        [embedding] = await provider.embed([paragraph])
-        punto = PointStruct(
-            id=int(idea["ID"]),
-            vector=embedding,
-            payload={
-                "ID": idea["ID"],
-                "Usuario": idea["Usuario"],
-                "Campo": idea["Campo"],
-                "Problema": idea["Problema"],
-                "Publico": idea["Publico"],
-                "Innovacion": idea["Innovacion"],
-                "ResumenLLM": idea["ResumenLLM"],
-            },
-        )
-        puntos.append(punto)
-    upsert_points("ideas", puntos)
+    payloads = [{
+        "ID": idea["ID"],
+        "Usuario": idea["Usuario"],
+        "Campo": idea["Campo"],
+        "Problema": idea["Problema"],
+        "Publico": idea["Publico"],
+        "Innovacion": idea["Innovacion"],
+        "ResumenLLM": idea["ResumenLLM"],
+    } for idea in ideas]
+    # Se vectorizan por lotes, escribiendo cada lote mientras se vectoriza el siguiente
+    await bulk_index(collection, [int(idea["ID"]) for idea in ideas], payloads, _idea_vectors(provider, topics))
 
 
 # Crea una idea para un proyecto usando Ollama, la vectoriza y la guarda en Qdrant
@@ -73,29 +84,31 @@ async def create_idea(idea: Idea, request: Request) -> IdeaRefinada:
         paragraph = f"{idea.Campo}. {idea.Problema}. {idea.Publico}. {idea.Innovacion}."
     # Carga los datos en Qdrant
     provider = request.app.state.provider
-    [embedding] = await provider.embed([paragraph])
-    point = PointStruct(
-        id=int(idea.ID),
-        vector=embedding,
-        payload={
-            "ID": idea.ID,
-            "Usuario": idea.Usuario,
-            "Campo": idea.Campo,
-            "Problema": idea.Problema,
-            "Publico": idea.Publico,
-            "Innovacion": idea.Innovacion,
-            "ResumenLLM": paragraph,
-        },
+    vectors = await provider.embed_array([paragraph])
+    # El texto de la idea cambio: se descarta su vector de topicos en cache
+    topics = request.app.state.topics
+    topics.invalidate(("ideas", idea.ID))
+    # El resumen es el mismo texto ya vectorizado: si el encoder es compartido se reutiliza
+    topico = await topics.vector(
+        paragraph,
+        owner=("ideas", idea.ID),
+        embedding=vectors[0] if topics.shares_encoder(provider) else None,
     )
-    upsert_points("ideas", [point])
+    await aupsert_vectors("ideas", [int(idea.ID)], {SEMANTIC: vectors, TOPIC: topico[None, :]}, [{
+        "ID": idea.ID,
+        "Usuario": idea.Usuario,
+        "Campo": idea.Campo,
+        "Problema": idea.Problema,
+        "Publico": idea.Publico,
+        "Innovacion": idea.Innovacion,
+        "ResumenLLM": paragraph,
+    }])
     return IdeaRefinada(ID=idea.ID, Usuario=idea.Usuario, ResumenLLM=paragraph)
 
 # Muestra todas las ideas de usuarios vectorizados
 @router.get("/all", summary="Obtener todas las ideas indexadas")
-async def get_all_ideas(request: Request) -> dict:
-    results, _ = search_all_points("ideas")
-    ideas = [item.payload for item in results]
-    return {"ideas": ideas}
+async def get_all_ideas(request: Request, cursor: str | None = None, limit: int | None = Query(None, ge=1)):
+    return stream_collection("ideas", "ideas", cursor, limit)
 
 # Carga las etiquetas un instrumentos
 def carga_labels_instrumento(instrumento: Instrumento, topicos: list):
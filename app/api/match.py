@@ -1,65 +1,37 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from qdrant_client.models import PointStruct, Filter
+import os
+import json
+import numpy as np
 from app.services.qdrant_store import *
 import traceback
 from app.models.proyecto import Proyecto
 from app.models.match_result import MatchResult
 from app.models.match_request import MatchRequest
+from app.models.match_batch_request import MatchBatchRequest
+from app.api.ideas import _topic_text_of_idea
+from app.services.match_cache import match_cache
+from app.services.matching import MATCH_OVERFETCH, match_ideas, match_funds, match_from_store
 
 router = APIRouter(prefix="/ia", tags=["ia"])
 
-# Funcion auxiliar para ponderar los matchs
-def _compute_match_score(topics_match, semantic_match, k:int):
-    # Dado que nada asegura que los matchs coincidan, hay que listarlos
-    semantic_dict = {int(h.id): h for h in semantic_match}
-    topic_dict = {int(h.id): h for h in topics_match}
-
-    # Obtenemos todas las ids: minimo 10, maximo 20
-    all_ids = set(semantic_dict) | set(topic_dict)
-
-    final_match: List[MatchResult] = []
-
-    # Recorremos por ID de los Match
-    for call_id in all_ids:
-        # Obtenemos los scores
-        sem = float(semantic_dict.get(call_id).score) if call_id in semantic_dict else 0.0
-        top = float(topic_dict.get(call_id).score) if call_id in topic_dict else 0.0
-
-        # Obtenemos los datos segun donde vengan
-        payload = (semantic_dict.get(call_id) or topic_dict.get(call_id)).payload or {}
-        #Calculamos la afinidad
-        affinity = 0.3 * sem + 0.7 * top
-        # Agregamos el match a la lista
-        final_match.append(MatchResult(
-        call_id=call_id,
-        name=payload.get("Titulo", "Fondo"),
-        agency=str(payload.get("Financiador")) if payload.get("Financiador") else None,
-        affinity=affinity,
-        semantic_score=sem,
-        rules_score=float(0.0),
-        topic_score=top,
-        explanations=[""]
-    ))
-    # Ordenamos la lista por afinidad
-    final_match.sort(key=lambda x: x.affinity, reverse=True)
-    k = min(k, len(final_match))
-    # Retornamos los k elementos
-    return final_match[:k]
-
-def _rules_score(payload: dict, req: MatchRequest) -> tuple[float, List[str]]:
-    score = 1.0
-    notes: List[str] = []
-    if req.regiones:
-        regiones_fondo = set(payload.get("Regiones", []))
-        if regiones_fondo and regiones_fondo.isdisjoint(set(req.regiones)):
-            score -= 0.6; notes.append("Región preferente no coincide")
-    if req.tipos_perfil:
-        perfiles = set(payload.get("TiposDePerfil", []))
-        if perfiles and perfiles.isdisjoint(set(req.tipos_perfil)):
-            score -= 0.4; notes.append("Tipo de perfil no coincide")
-    return max(0.0, min(score, 1.0)), notes
+# Ideas por tramo en /ia/match/batch (una consulta a Qdrant y una linea por idea)
+MATCH_BATCH_CHUNK = int(os.getenv("MATCH_BATCH_CHUNK", "128"))
+
+# Parametros que definen un resultado de /ia/match (y de cada idea en /ia/match/batch)
+def _match_params(req) -> dict:
+    return {"endpoint": "match", "overfetch": MATCH_OVERFETCH, **req.model_dump(exclude={"idea_id", "idea_ids"})}
+
+# Texto para recomputar el vector semantico de una idea guardada sin el
+def _semantic_text_of_idea(payload: dict) -> str:
+    text = payload.get("ResumenLLM") or " ".join(filter(None, [
+        payload.get("Campo"), payload.get("Problema"),
+        payload.get("Publico"), payload.get("Innovacion"),
+    ])) or ""
+    return text.strip()
 
 '''
 Recibe el ID de una Idea subida por algun Usuario y luego obtiene los MatchResult
@@ -69,74 +41,52 @@ mas similares en un arreglo
 async def match(req: MatchRequest, request: Request):
     try:
         print(f"Iniciando match para idea ID: {req.idea_id}")
-        recs = client.retrieve(
-            collection_name="ideas",
-            ids=[req.idea_id],
-            with_vectors=True,
-            with_payload=True,
+        # Mismo resultado mientras no cambien la idea, el catalogo ni los parametros
+        cache_key = await match_cache.akey("ideas", req.idea_id, _match_params(req))
+        cached = await match_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        qf: Filter | None = build_filter(
+            estado=req.estado,
+            regiones=req.regiones,
+            tipos_perfil=req.tipos_perfil,
+            monto=req.monto,
+            fecha=req.fecha,
         )
+        # Si la idea ya esta en la matriz de afinidad no hace falta inferir ni buscar
+        out = match_from_store(req.idea_id, req.top_k, req, qf)
+        if out is not None:
+            await match_cache.aput(cache_key, [m.model_dump() for m in out])
+            return out
+        recs = await aretrieve("ideas", [req.idea_id])
         if not recs:
             print(f"Error: Idea {req.idea_id} no encontrada en colección 'ideas'")
             raise HTTPException(status_code=404, detail="Idea no encontrada. Procesa la idea primero.")
         idea_rec = recs[0]
         payload = idea_rec.payload
         print(f"Idea encontrada. Payload: {payload}")
-        topics, probs = request.app.state.topic_model.transform(payload['ResumenLLM'])
-        vector = probs[0][1:]
-        print(f"Vector de topics generado. Dimensión: {len(vector)}")
-        print(f"Vector de topicos generado: {vector}")
-        idea_vec = idea_rec.vector
+        # El vector de topicos se guarda al subir la idea; solo se infiere si falta
+        vector = named_vector(idea_rec, TOPIC)
+        if vector is None:
+            vector = await request.app.state.topics.vector(_topic_text_of_idea(payload), owner=("ideas", req.idea_id))
+        print(f"Vector de topics. Dimensión: {len(vector)}")
+        idea_vec = named_vector(idea_rec, SEMANTIC)
         if not idea_vec:
             print("Generando vector de idea...")
             payload = idea_rec.payload or {}
-            text = payload.get("ResumenLLM") or " ".join(filter(None, [
-                payload.get("Campo"), payload.get("Problema"),
-                payload.get("Publico"), payload.get("Innovacion"),
-            ])) or ""
-            text = text.strip()
+            text = _semantic_text_of_idea(payload)
             if not text:
                 raise HTTPException(status_code=500, detail="Idea almacenada sin vector ni texto para recomputar.")
             provider = request.app.state.provider
-            [idea_vec] = await provider.embed([text])
-            upsert_points("ideas", [
-                PointStruct(id=int(req.idea_id), vector=idea_vec, payload=payload)
-            ])
-        
-        qf: Filter | None = build_filter(
-            estado=req.estado,
-            regiones=req.regiones,
-            tipos_perfil=req.tipos_perfil
-        )
-        
-        print("Buscando matches por topics...")
-        hits_topic = search_topics(vector, top_k=req.top_k, must_filter=None)
-        print(f"Encontrados {len(hits_topic)} matches por topics")
-        print(f"Matches por topico:\n{hits_topic}")
-        
-        print("Buscando matches semánticos...")
-        hits = search_funds(idea_vec, top_k=req.top_k, must_filter=qf)
-        print(f"Encontrados {len(hits)} matches semánticos")
-        print(f"Matches semanticos:\n{hits_topic}")
-        
-        out: List[MatchResult] = []
-        for h_topic, h in zip(hits_topic, hits):
-            payload = h.payload or {}
-            rules, notes = _rules_score(payload, req)
-            semantic = float(h.score)
-            topic = float(h_topic.score)
-            affinity = 0.20 * semantic + 0.25 * rules + 0.55*topic
-            out.append(MatchResult(
-                call_id=int(h.id),
-                name=payload.get("Titulo", "Fondo"),
-                agency=str(payload.get("Financiador")) if payload.get("Financiador") is not None else None,
-                affinity=affinity,
-                semantic_score=semantic,
-                rules_score=rules,
-                explanations=notes,
-                topic_score=topic
-            ))
-        
-        out.sort(key=lambda x: x.affinity, reverse=True)
+            vectors = await provider.embed_array([text])
+            idea_vec = vectors[0]
+            await aupsert_vectors("ideas", [int(req.idea_id)], {
+                SEMANTIC: vectors, TOPIC: np.asarray(vector, dtype=np.float32)[None, :]
+            }, [payload])
+
+        print("Buscando matches por topics y semánticos...")
+        out = (await match_ideas(idea_vec, vector, req, qf))[0]
+        await match_cache.aput(cache_key, [m.model_dump() for m in out])
         print(f"Retornando {len(out)} matches ordenados")
         return out
         
@@ -145,26 +95,103 @@ async def match(req: MatchRequest, request: Request):
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+# Calcula los matches de un tramo de ideas: un retrieve, vectores faltantes
+# en lote, busquedas en lote y ponderacion vectorizada. Una linea por idea
+async def _match_chunk(idea_ids: List[int], req: MatchBatchRequest, qf: Filter | None, request: Request) -> List[dict]:
+    # Primero los resultados en cache
+    params = _match_params(req)
+    unique = list(dict.fromkeys(idea_ids))
+    keys = dict(zip(unique, await match_cache.akeys("ideas", unique, params)))
+    lines = {}
+    for i, cached in zip(keys, await match_cache.aget_many(list(keys.values()))):
+        if cached is not None:
+            lines[i] = {"idea_id": i, "matches": cached}
+    # Luego las ideas que se pueden servir desde la matriz de afinidad
+    for i in keys:
+        if i not in lines:
+            served = match_from_store(i, req.top_k, req, qf)
+            if served is not None:
+                lines[i] = {"idea_id": i, "matches": [m.model_dump() for m in served]}
+                await match_cache.aput(keys[i], lines[i]["matches"])
+    pending = [i for i in keys if i not in lines]
+    recs = {int(r.id): r for r in await aretrieve("ideas", pending)} if pending else {}
+    for i in pending:
+        if i not in recs:
+            lines[i] = {"idea_id": i, "error": "Idea no encontrada. Procesa la idea primero."}
+    ideas = [i for i in pending if i in recs]
+    payloads = {i: recs[i].payload or {} for i in ideas}
+    semantic = {i: named_vector(recs[i], SEMANTIC) for i in ideas}
+    topic = {i: named_vector(recs[i], TOPIC) for i in ideas}
+    # Vectores semanticos faltantes: se recomputan todos juntos
+    missing = [i for i in ideas if semantic[i] is None or len(semantic[i]) == 0]
+    for i in missing:
+        if not _semantic_text_of_idea(payloads[i]):
+            lines[i] = {"idea_id": i, "error": "Idea almacenada sin vector ni texto para recomputar."}
+    missing = [i for i in missing if i not in lines]
+    ideas = [i for i in ideas if i not in lines]
+    if missing:
+        vectors = await request.app.state.provider.embed_array([_semantic_text_of_idea(payloads[i]) for i in missing])
+        semantic.update(zip(missing, vectors))
+    # Vectores de topicos faltantes: una sola inferencia
+    missing_topic = [i for i in ideas if topic[i] is None]
+    if missing_topic:
+        topicos = await request.app.state.topics.vectors([_topic_text_of_idea(payloads[i]) for i in missing_topic])
+        topic.update(zip(missing_topic, topicos))
+    recomputed = list(dict.fromkeys(missing + missing_topic))
+    if recomputed:
+        await aupsert_vectors("ideas", recomputed, {
+            SEMANTIC: np.stack([np.asarray(semantic[i], dtype=np.float32) for i in recomputed]),
+            TOPIC: np.stack([np.asarray(topic[i], dtype=np.float32) for i in recomputed]),
+        }, [payloads[i] for i in recomputed])
+    if ideas:
+        ranked = await match_ideas(
+            np.stack([np.asarray(semantic[i], dtype=np.float32) for i in ideas]),
+            np.stack([np.asarray(topic[i], dtype=np.float32) for i in ideas]),
+            req, qf,
+        )
+        for i, matches in zip(ideas, ranked):
+            lines[i] = {"idea_id": i, "matches": [m.model_dump() for m in matches]}
+            await match_cache.aput(keys[i], lines[i]["matches"])
+    return [lines[i] for i in idea_ids]
+
+'''
+Recibe una lista de IDs de ideas y retorna sus matches en streaming (NDJSON):
+una linea {"idea_id", "matches"} o {"idea_id", "error"} por idea, en orden
+'''
+@router.post("/match/batch", summary="Match de muchas ideas en una sola llamada")
+async def match_batch(req: MatchBatchRequest, request: Request):
+    qf: Filter | None = build_filter(
+        estado=req.estado,
+        regiones=req.regiones,
+        tipos_perfil=req.tipos_perfil,
+        monto=req.monto,
+        fecha=req.fecha,
+    )
+    async def lines():
+        for start in range(0, len(req.idea_ids), MATCH_BATCH_CHUNK):
+            chunk = req.idea_ids[start:start + MATCH_BATCH_CHUNK]
+            try:
+                results = await _match_chunk(chunk, req, qf, request)
+            except Exception as e:
+                print(f"Error en match batch: {str(e)}")
+                print(f"Traceback: {traceback.format_exc()}")
+                results = [{"idea_id": i, "error": f"Error interno: {str(e)}"} for i in chunk]
+            yield "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in results)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/health/collections")
 async def check_collections():
     """Endpoint para verificar el estado de las colecciones"""
     try:
-        ideas_scroll = client.scroll("ideas", limit=1000)
-        ideas_count = len(ideas_scroll[0])
-        funds_scroll = client.scroll("funds", limit=1000)
-        funds_count = len(funds_scroll[0])
-        funds_topics_scroll = client.scroll("funds_topics", limit=1000)
-        funds_topics_count = len(funds_topics_scroll[0])
-        similar_projects_scroll = client.scroll("similar_projects", limit=1000)
-        similar_projects_count = len(similar_projects_scroll[0])
-        user_projects_scroll = client.scroll("user_projects", limit=1000)
-        user_projects_count = len(user_projects_scroll[0])
+        ideas_count = await acount("ideas")
+        funds_count = await acount("funds")
+        similar_projects_count = await acount("similar_projects")
+        user_projects_count = await acount("user_projects")
         return {
             "status": "ok",
             "collections": {
                 "ideas": ideas_count,
                 "funds": funds_count,
-                "funds_topics": funds_topics_count,
                 "similar_projects": similar_projects_count,
                 "user_projects": user_projects_count
             }
@@ -176,7 +203,6 @@ async def check_collections():
             "collections": {
                 "ideas": "unknown",
                 "funds": "unknown", 
-                "funds_topics": "unknown",
                 "similar_projects": "unknown",
                 "user_projects": "unknown"
             }
@@ -184,17 +210,12 @@ async def check_collections():
 
 @router.post("/match/projectmatch", response_model=List[MatchResult])
 async def match(req: MatchRequest, request: Request):
-    recs = client.retrieve(
-        collection_name="ideas",
-        ids=[req.idea_id],
-        with_vectors=True,
-        with_payload=True,
-    )
+    recs = await aretrieve("ideas", [req.idea_id])
     if not recs:
         raise HTTPException(status_code=404, detail="Idea no encontrada. Procesa la idea primero.")
     idea_rec = recs[0]
-    idea_vec = idea_rec.vector
-    hits = search_projects(idea_vec, top_k=req.top_k, must_filter=None)
+    idea_vec = named_vector(idea_rec, SEMANTIC)
+    hits = await asearch_projects(idea_vec, top_k=req.top_k, must_filter=None)
     out: List[MatchResult] = []
     for h in hits:
         payload = h.payload or {}
@@ -215,17 +236,12 @@ async def match(req: MatchRequest, request: Request):
 
 @router.post("/match/projectmatchhistoric", response_model=List[MatchResult])
 async def match(req: MatchRequest, request: Request):
-    recs = client.retrieve(
-        collection_name="user_projects",
-        ids=[req.idea_id],
-        with_vectors=True,
-        with_payload=True,
-    )
+    recs = await aretrieve("user_projects", [req.idea_id])
     if not recs:
         raise HTTPException(status_code=404, detail="Idea no encontrada. Procesa la idea primero.")
     idea_rec = recs[0]
-    idea_vec = idea_rec.vector
-    hits = search_projects(idea_vec, top_k=req.top_k, must_filter=None)
+    idea_vec = named_vector(idea_rec, SEMANTIC)
+    hits = await asearch_projects(idea_vec, top_k=req.top_k, must_filter=None)
     out: List[MatchResult] = []
     for h in hits:
         payload = h.payload or {}
@@ -249,14 +265,19 @@ async def match(req: MatchRequest, request: Request):
 async def match_idea_with_funds(id_idea: int, k: int, request: Request):
     try:
         print(f"Iniciando match para idea ID: {id_idea}")
+        # Mismo resultado mientras no cambien la idea ni el catalogo
+        cache_key = await match_cache.akey("ideas", id_idea, {"endpoint": "funds", "k": k, "overfetch": MATCH_OVERFETCH})
+        cached = await match_cache.aget(cache_key)
+        if cached is not None:
+            return cached
+        # Si la idea ya esta en la matriz de afinidad no hace falta inferir ni buscar
+        response = match_from_store(id_idea, k)
+        if response is not None:
+            await match_cache.aput(cache_key, [m.model_dump() for m in response])
+            return response
 
         # Recolectamos la idea segun la ID
-        rec = client.retrieve(
-            collection_name="ideas",
-            ids = [id_idea],
-            with_vectors=True,
-            with_payload=True
-        )
+        rec = await aretrieve("ideas", [id_idea])
         
         # Manejo de errores en caso de que no exista la idea
         if not rec: 
@@ -266,19 +287,16 @@ async def match_idea_with_funds(id_idea: int, k: int, request: Request):
         # Recolectamos la idea, su contenido y su vector semantico
         user_idea = rec[0]
         payload = user_idea.payload
-        semantic_vector = user_idea.vector
-        # Extraemos los vectores de los topicos
-        _, probs = request.app.state.topic_model.transform(payload.get('ResumenLLM'))
-        topic_vector = probs[0][1:]
+        semantic_vector = named_vector(user_idea, SEMANTIC)
+        # Vector de topicos guardado al subir la idea; solo se infiere si falta
+        topic_vector = named_vector(user_idea, TOPIC)
+        if topic_vector is None:
+            topic_vector = await request.app.state.topics.vector(_topic_text_of_idea(payload), owner=("ideas", id_idea))
 
         # Si, por alguna razon no hay vector semantico, lo creamos
         if not semantic_vector:
             # Recolectamos el texto con valor semantico
-            text = payload.get("ResumenLLM") or " ".join(filter(None, [
-                payload.get("Campo"), payload.get("Problema"),
-                payload.get("Publico"), payload.get("Innovacion"),
-            ])) or ""
-            text = text.strip()
+            text = _semantic_text_of_idea(payload or {})
 
             # En caso de no tener vector ni texto, no hay match
             if not text:
@@ -286,22 +304,20 @@ async def match_idea_with_funds(id_idea: int, k: int, request: Request):
             
             # Generamos el vector semantico
             provider = request.app.state.provider
-            [semantic_vector] = await provider.embed([text])
+            vectors = await provider.embed_array([text])
+            semantic_vector = vectors[0]
             # Subimos el vector a la coleccion qdrant
-            upsert_points("ideas", [
-                PointStruct(id=id_idea, vector=semantic_vector, payload=payload)
-            ])
+            await aupsert_vectors("ideas", [id_idea], {
+                SEMANTIC: vectors, TOPIC: np.asarray(topic_vector, dtype=np.float32)[None, :]
+            }, [payload])
 
         ########################################
         ### Implementar filtros mas adelante ###
         ########################################
 
-        # Realizamos el match por topicos
-        hits_topic = search_topics(topic_vector, top_k=k, must_filter=None)
-        # Realizamos el match semantico
-        hits_semantic = search_funds(semantic_vector, top_k=k, must_filter=None)
-        # Generamos la ponderacion
-        response = _compute_match_score(hits_topic, hits_semantic, k)
+        # Candidatos semanticos y por topicos, con puntajes exactos, ya ponderados
+        response = (await match_funds(semantic_vector, topic_vector, k))[0]
+        await match_cache.aput(cache_key, [m.model_dump() for m in response])
         # Retornamos
         return response
 
@@ -331,14 +347,14 @@ def _text_of_proyect_dict(p: dict) -> str:
 async def match_idea_with_funds(id_idea: int, k: int, request: Request):
     try:
         print(f"Iniciando match para idea ID: {id_idea}")
+        # Mismo resultado mientras no cambien el proyecto ni el catalogo
+        cache_key = await match_cache.akey("user_projects", id_idea, {"endpoint": "funds", "k": k, "overfetch": MATCH_OVERFETCH})
+        cached = await match_cache.aget(cache_key)
+        if cached is not None:
+            return cached
 
         # Recolectamos la idea segun la ID
-        rec = client.retrieve(
-            collection_name="user_projects",
-            ids = [id_idea],
-            with_vectors=True,
-            with_payload=True
-        )
+        rec = await aretrieve("user_projects", [id_idea])
         user_idea = rec[0]
         payload = user_idea.payload
         
@@ -356,10 +372,11 @@ async def match_idea_with_funds(id_idea: int, k: int, request: Request):
         # Recolectamos la idea, su contenido y su vector semantico
         user_idea = rec[0]
         payload = user_idea.payload
-        semantic_vector = user_idea.vector
-        # Extraemos los vectores de los topicos
-        _, probs = request.app.state.topic_model.transform(stringtext)
-        topic_vector = probs[0][1:]
+        semantic_vector = named_vector(user_idea, SEMANTIC)
+        # Vector de topicos guardado al subir el proyecto; solo se infiere si falta
+        topic_vector = named_vector(user_idea, TOPIC)
+        if topic_vector is None:
+            topic_vector = await request.app.state.topics.vector(stringtext, owner=("user_projects", id_idea))
 
         # Si, por alguna razon no hay vector semantico, lo creamos
         if not semantic_vector:
@@ -373,22 +390,20 @@ async def match_idea_with_funds(id_idea: int, k: int, request: Request):
             
             # Generamos el vector semantico
             provider = request.app.state.provider
-            [semantic_vector] = await provider.embed([text])
+            vectors = await provider.embed_array([text])
+            semantic_vector = vectors[0]
             # Subimos el vector a la coleccion qdrant
-            upsert_points("user_projects", [
-                PointStruct(id=id_idea, vector=semantic_vector, payload=payload)
-            ])
+            await aupsert_vectors("user_projects", [id_idea], {
+                SEMANTIC: vectors, TOPIC: np.asarray(topic_vector, dtype=np.float32)[None, :]
+            }, [payload])
 
         ########################################
         ### Implementar filtros mas adelante ###
         ########################################
 
-        # Realizamos el match por topicos
-        hits_topic = search_topics(topic_vector, top_k=k, must_filter=None)
-        # Realizamos el match semantico
-        hits_semantic = search_funds(semantic_vector, top_k=k, must_filter=None)
-        # Generamos la ponderacion
-        response = _compute_match_score(hits_topic, hits_semantic, k)
+        # Candidatos semanticos y por topicos, con puntajes exactos, ya ponderados
+        response = (await match_funds(semantic_vector, topic_vector, k))[0]
+        await match_cache.aput(cache_key, [m.model_dump() for m in response])
         # Retornamos
         return response
 
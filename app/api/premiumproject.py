@@ -6,7 +6,6 @@ from app.models.idea import Idea
 from app.models.instrumento import Instrumento
 from app.models.idea_refinada import IdeaRefinada
 from app.services.qdrant_store import upsert_points
-from app.services.qdrant_store import search_all_points
 from app.utils.llm_ollama import llm_generate
 
 router = APIRouter(prefix="/premium", tags=["premium"])
@@ -1,8 +1,6 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Query
 from pydantic import create_model
 from typing import List
-from bertopic import BERTopic
-from sentence_transformers import SentenceTransformer
 from qdrant_client.models import PointStruct
 import requests
 import json
@@ -11,7 +9,10 @@ from app.models.proyecto import Proyecto
 from app.models.user_project import UserProject
 from app.models.match_result import MatchResult
 from app.services.qdrant_store import upsert_points
-from app.services.qdrant_store import search_all_points
+from app.services.qdrant_store import aupsert_vectors
+from app.services.qdrant_store import SEMANTIC, TOPIC
+from app.services.bulk_writer import bulk_index
+from app.utils.streaming import stream_collection
 from app.services.embeddings_factory import get_embeddings_provider
 from app.services.qdrant_store import *
 
@@ -29,31 +30,35 @@ def _text_of_proyect_dict(p: dict) -> str:
         p["Titulo"], p["Descripcion"], p["Alcance"], p["Area"]
     ]))
 
+# Vector semantico de un lote de proyectos
+def _project_vectors(provider):
+    async def embed(batch: List[dict]):
+        return await provider.embed_array(list(map(_text_of_proyect_dict, batch)))
+    return embed
+
+# Vectores semantico y de topicos (del mismo texto) de un lote de proyectos
+def _user_project_vectors(provider, topics):
+    async def embed(batch: List[dict]) -> dict:
+        texts = list(map(_text_of_proyect_dict, batch))
+        vectors = await provider.embed_array(texts)
+        topicos = await topics.vectors(texts, vectors if topics.shares_encoder(provider) else None)
+        return {SEMANTIC: vectors, TOPIC: topicos}
+    return embed
+
 # Sube y vectoriza los proyectos del BackEnd
-async def subir_proyectos_de_core(provider):
+async def subir_proyectos_de_core(provider, collection: str = "similar_projects"):
     proyectos = []
     with open('proyectos.json') as json_data:
         proyectos = json.load(json_data)
-    texts = list(map(_text_of_proyect_dict, proyectos)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for p, vec in zip(proyectos, vectors):
-        points.append(PointStruct(id=int(p["ID"]), vector=vec, payload=p))
-    upsert_points("similar_projects", points)
+    await bulk_index(collection, [int(p["ID"]) for p in proyectos], proyectos, _project_vectors(provider))
 
 # Sube y vectoriza los proyectos del BackEnd
-async def subir_proyectos_del_backend(provider):
+# Guarda el vector semantico y el de topicos (del mismo texto) en el mismo punto
+async def subir_proyectos_del_backend(provider, topics, collection: str = "user_projects"):
     proyectos = []
     with open('proyectos.json') as json_data:
         proyectos = json.load(json_data)
-    texts = list(map(_text_of_proyect_dict, proyectos)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for p, vec in zip(proyectos, vectors):
-        points.append(PointStruct(id=int(p["ID"]), vector=vec, payload=p))
-    upsert_points("user_projects", points)
+    await bulk_index(collection, [int(p["ID"]) for p in proyectos], proyectos, _user_project_vectors(provider, topics))
 
 # Sube y vectoriza el proyecto subido por el usuario
 @router.post("", summary="Agregar e indexar un solo proyecto")
@@ -61,74 +66,47 @@ async def upsert_one_proyect(item: Proyecto, request: Request) -> dict:
     items = [item]
     provider = request.app.state.provider
     texts = list(map(_text_of_proyect, items)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for p, vec in zip(items, vectors):
-        payload = p.model_dump()
-        points.append(PointStruct(id=int(p.ID), vector=vec, payload=payload))
-    upsert_points("similar_projects", points)
-    return {"upserted": len(points)}
+    vectors = await provider.embed_array(texts)
+    payloads = [p.model_dump() for p in items]
+    await aupsert_vectors("similar_projects", [int(p.ID) for p in items], vectors, payloads)
+    return {"upserted": len(payloads)}
 
 # Sube y vectoriza multiples proyectos subidos por el usuario
 @router.post("/upsert", summary="Agregar e indexar mutiples proyectos")
 async def upsert_projects(items: List[Proyecto], request: Request) -> dict:
     provider = request.app.state.provider
-    texts = list(map(_text_of_proyect, items)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for p, vec in zip(items, vectors):
-        payload = p.model_dump()
-        points.append(PointStruct(id=int(p.ID), vector=vec, payload=payload))
-    upsert_points("similar_projects", points)
-    return {"upserted": len(points)}
+    payloads = [p.model_dump() for p in items]
+    await bulk_index("similar_projects", [int(p.ID) for p in items], payloads, _project_vectors(provider))
+    return {"upserted": len(payloads)}
 
 # Muestra todos los proyectos vectorizados
 @router.get("/all", summary="Obtener todos los proyectos indexados")
-async def get_all_projects(request: Request) -> dict:
-    results, next_page = search_all_points("similar_projects")
-    proyectos = [item.payload for item in results]
-    return {"projects": proyectos}
+async def get_all_projects(request: Request, cursor: str | None = None, limit: int | None = Query(None, ge=1)):
+    return stream_collection("similar_projects", "projects", cursor, limit)
 
 # Sube y vectoriza multiples proyectos subidos por el usuario
 @router.post("/upsertusers", summary="Indexar/actualizar proyectos (batch)")
 async def upsert_projects_users(items: List[Proyecto], request: Request) -> dict:
     provider = request.app.state.provider
-    texts = list(map(_text_of_proyect, items)) # Optimizar funcion con map()
-    vectors = await provider.embed(texts)
-    lista_topic = []
-    points = []
-    for p, vec in zip(items, vectors):
-        payload = p.model_dump()
-
-        # if vec == None:
-        #     [vec] = await provider.embed([payload.Descripcion])
-
-        points.append(PointStruct(
-            id=int(p.ID),
-            vector=vec,
-            payload=payload))
-    upsert_points("user_projects", points)
-    return {"upserted": len(points)}
+    topics = request.app.state.topics
+    for p in items:
+        topics.invalidate(("user_projects", p.ID))
+    payloads = [p.model_dump() for p in items]
+    await bulk_index("user_projects", [int(p.ID) for p in items], payloads, _user_project_vectors(provider, topics))
+    return {"upserted": len(payloads)}
 
 # Realiza el match entre un proyecto de usuario subido previamente a Qdrant
 @router.get("/user-projects/{id_project}/matches", summary="Retorna los proyectos históricos más similares al del usuario")
 async def match_user_projects_with_historical_projects(id_project: int, request: Request):
     # Buscamos el proyecto en Qdrant
-    rec = client.retrieve(
-        collection_name="user_projects",
-        ids=[id_project],
-        with_vectors=True,
-        with_payload=True
-    )
+    rec = await aretrieve("user_projects", [id_project])
     if not rec:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado. Procesa el proyecto primero.")
     # Obtenemos los vectores
     projectFromQdrant = rec[0]
-    projectVector = projectFromQdrant.vector
+    projectVector = named_vector(projectFromQdrant, SEMANTIC)
     # Realizamos el match semántico
-    hits = search_projects(projectVector)
+    hits = await asearch_projects(projectVector)
     # Preparamos el retorno
     out: List[MatchResult] = []
     for h in hits:
@@ -151,10 +129,8 @@ async def match_user_projects_with_historical_projects(id_project: int, request:
     return out
 
 @router.get("/all-user-projects", summary="Obtener todos los proyectos de usuarioes indexados")
-async def get_all_projects(request: Request) -> dict:
-    results, next_page = search_all_points("user_projects")
-    proyectos = [item.payload for item in results]
-    return {"user_projects": proyectos}
+async def get_all_user_projects(request: Request, cursor: str | None = None, limit: int | None = Query(None, ge=1)):
+    return stream_collection("user_projects", "user_projects", cursor, limit)
 
 # Sección de pruebas: Funciona solo si el archivo se ejecuta como script
 if __name__ == "__main__":
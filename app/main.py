@@ -3,12 +3,16 @@ from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from sentence_transformers import SentenceTransformer
-from bertopic import BERTopic
+import os
 import traceback
 
 # Rutas de los controladores para cada servicio
-from app.services.embeddings_factory import get_embeddings_provider
+from app.services.embeddings_factory import get_embeddings_provider, get_topic_encoder
+from app.services.model_registry import registry
+from app.services.match_cache import match_cache
+from app.services.affinity_store import affinity_store
+from app.services.topic_engine import load_topic_model
+from app.services.topics import TopicInference, TopicVectorCache, topic_model_version
 from app.services.qdrant_store import *
 from app.api import ideas
 from app.api import ia
@@ -19,10 +23,10 @@ from app.api import rag
 from app.api import premiumproject
 
 
-from app.api.projects import subir_proyectos_del_backend
-from app.api.projects import subir_proyectos_de_core
-from app.api.funds import subir_instrumentos_de_core
-from app.api.ideas import subir_ideas_del_backend
+from app.api.projects import subir_proyectos_del_backend, _user_project_vectors
+from app.api.projects import subir_proyectos_de_core, _project_vectors
+from app.api.funds import subir_instrumentos_de_core, _fund_vectors
+from app.api.ideas import subir_ideas_del_backend, _idea_vectors
 
 # Prefijo de la ruta para acceder a la API
 API_PREFIX = "/api/v1"
@@ -33,38 +37,70 @@ async def lifespan(app: FastAPI):
     # Inicia el servicio de Qdrant y guarda sus propiedades
     print("Iniciando servicio de Qdrant...")
     provider = get_embeddings_provider()
-    probe = await provider.embed(["_dim_probe"])
-    vector_dim = len(probe[0])
-    # Carga los datos en collecciones de Qdrant
-    print("Cargando colecciones de Qdrant...")
-    # Colección ideas: ideas de los usuarios vectorizadas
-    ensure_collection("ideas", vector_dim)
-    # Colección funds: fondos obtenidos del scrapping vectorizados
-    ensure_collection("funds", vector_dim)
-    # Tópicos de los fondos
-    ensure_collection("funds_topics", NUMBER_OF_TOPICS)
-    ensure_collection("similar_projects", vector_dim)
-    ensure_collection("user_projects", vector_dim)
-    # Inicia el modelo de BERTopic y guarda sus propiedades
-    print("Iniciando modelo de BERTopic...")
-    model = SentenceTransformer("jinaai/jina-embeddings-v2-base-es", trust_remote_code=True, device="cpu")
-    topic_model = BERTopic.load("ayuda", embedding_model = model)
+    probe = await provider.embed_array(["_dim_probe"])
+    vector_dim = probe.shape[1]
+    # Inicia el modelo de topicos (motor NumPy o BERTopic, segun TOPIC_ENGINE)
+    print("Iniciando modelo de topicos...")
+    # Si TOPIC_EMBEDDINGS_MODEL coincide con el semantico se reutiliza su encoder.
+    # El modelo no carga encoder propio: siempre recibe los embeddings ya calculados
+    topic_encoder = get_topic_encoder(provider)
+    topic_model = load_topic_model("ayuda")
+    topic_version = topic_model_version("ayuda", topic_encoder.model_name)
     # Guarda en memoria los servicios y modelos compartidos
     print("Estableciento estados...")
     app.state.provider = provider
     app.state.vector_dim = vector_dim
     app.state.topic_model = topic_model
-    # Finalmente poblar con los datos en el BackEnd
-    print("Cargando ideas de usuarios desde el BackEnd...")
-    await subir_ideas_del_backend(provider)
-    print("Cargando instrumentos desde el BackEnd...")
-    await subir_instrumentos_de_core(provider, topic_model)
-    print("Cargando proyectos desde el BackEnd...")
-    await subir_proyectos_del_backend(provider)
-    await subir_proyectos_de_core(provider)
+    # Cache de vectores de topicos compartido por los endpoints de match
+    app.state.topics = TopicInference(topic_model, TopicVectorCache(
+        topic_version,
+        max_items=int(os.getenv("TOPICS_CACHE_MAX_ITEMS", "4096")),
+        ttl_seconds=float(os.getenv("TOPICS_CACHE_TTL_SECONDS", "3600")),
+    ), topic_encoder)
+    topics = app.state.topics
+    named = {SEMANTIC: vector_dim, TOPIC: NUMBER_OF_TOPICS}
+    # Colecciones de Qdrant: (nombre, vectores, archivo fuente, carga)
+    #   ideas: ideas de los usuarios vectorizadas (semantico + topicos)
+    #   funds: fondos obtenidos del scrapping, con vector semantico y de topicos
+    #   similar_projects: proyectos historicos (solo semantico)
+    #   user_projects: proyectos de usuarios, semantico y de topicos en cada punto
+    # Cada una con su carga desde la fuente (en la coleccion fisica dada) y
+    # la vectorizacion de sus payloads, para los puntos escritos en runtime
+    colecciones = [
+        ("ideas", named, "ideas.json",
+         lambda c: subir_ideas_del_backend(provider, topics, c), _idea_vectors(provider, topics)),
+        ("funds", named, "instrumentos.json",
+         lambda c: subir_instrumentos_de_core(provider, topics, c), _fund_vectors(provider, topics)),
+        ("similar_projects", vector_dim, "proyectos.json",
+         lambda c: subir_proyectos_de_core(provider, c), _project_vectors(provider)),
+        ("user_projects", named, "proyectos.json",
+         lambda c: subir_proyectos_del_backend(provider, topics, c), _user_project_vectors(provider, topics)),
+    ]
+    # Con Qdrant persistente (QDRANT_MODE=local|server) las colecciones ya
+    # cargadas con los mismos datos y modelos no se vuelven a vectorizar.
+    # Con varios workers solo uno carga cada coleccion; los demas esperan
+    print("Cargando colecciones de Qdrant...")
+    for name, vector_size, source, cargar, embed in colecciones:
+        parts = dict(
+            semantic=f"{provider.model_name}|{provider.normalize}",
+            topics=topic_version if isinstance(vector_size, dict) else None,
+            vectors=vector_size,
+        )
+        version = ingest_version([source], **parts, index=INDEX_PROFILES.get(name))
+        if await aload_collection(name, vector_size, version, ingest_version([], **parts), cargar, embed):
+            print(f"Coleccion {name} cargada desde {source}")
+        else:
+            print(f"Coleccion {name} al dia, se omite la carga")
+    # Matriz de afinidad ideas x fondos; luego se mantiene con cada escritura
+    print("Calculando matriz de afinidad...")
+    await aload_affinity_store()
+    print(f"Estadisticas de embeddings: {provider.stats()}")
     # Listo
     print("Modelos cargados exitosamente!")
     yield
+    if topic_encoder is not provider:
+        topic_encoder.close()
+    provider.close()
 
 app = FastAPI(title="MatchaFunding - API de Inteligencia Artificial", version="0.1.0", lifespan=lifespan)
 
@@ -112,6 +148,26 @@ def health():
         "service": app.title,
     }
 
+# Contadores del proveedor de embeddings (cache, etc.)
+@app.get(f"{API_PREFIX}/health/embeddings")
+def health_embeddings():
+    return {**app.state.provider.stats(), "topics_cache": app.state.topics.cache.stats()}
+
+# Aciertos y tamano del cache de resultados de match
+@app.get(f"{API_PREFIX}/health/match-cache")
+def health_match_cache():
+    return match_cache.stats()
+
+# Estado y aciertos de la matriz de afinidad materializada
+@app.get(f"{API_PREFIX}/health/affinity")
+def health_affinity():
+    return affinity_store.stats()
+
+# Modelos cargados en este worker, con referencias y memoria aproximada
+@app.get(f"{API_PREFIX}/health/models")
+def health_models():
+    return registry.memory_report()
+
 # Routers para los diferentes servicios
 app.include_router(projects.router, prefix=API_PREFIX)
 app.include_router(ideas.router, prefix=API_PREFIX)
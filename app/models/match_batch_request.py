@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field
+from pydantic.config import ConfigDict
+from typing import List, Optional
+from datetime import date
+
+class MatchBatchRequest(BaseModel):
+    idea_ids: List[int] = Field(..., description="IDs de ideas ya procesadas y guardadas en Qdrant")
+    top_k: int = 10
+    estado: Optional[str] = "abierto"
+    regiones: Optional[List[str]] = None
+    tipos_perfil: Optional[List[str]] = None
+    monto: Optional[int] = Field(None, description="Monto solicitado; filtra fondos cuyo rango lo incluye")
+    fecha: Optional[date] = Field(None, description="Fecha (YYYY-MM-DD); filtra fondos abiertos en esa fecha")
+
+    model_config = ConfigDict(populate_by_name=True)
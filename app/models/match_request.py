@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from pydantic.config import ConfigDict
 from typing import List, Optional
+from datetime import date
 
 class MatchRequest(BaseModel):
     idea_id: int = Field(..., description="ID de la idea ya procesada y guardada en Qdrant")
@@ -8,5 +9,7 @@ class MatchRequest(BaseModel):
     estado: Optional[str] = "abierto"
     regiones: Optional[List[str]] = None
     tipos_perfil: Optional[List[str]] = None
+    monto: Optional[int] = Field(None, description="Monto solicitado; filtra fondos cuyo rango lo incluye")
+    fecha: Optional[date] = Field(None, description="Fecha (YYYY-MM-DD); filtra fondos abiertos en esa fecha")
 
     model_config = ConfigDict(populate_by_name=True)
\ No newline at end of file
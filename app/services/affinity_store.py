@@ -0,0 +1,256 @@
+import os
+import threading
+from typing import Any, Dict, Iterable, List
+import numpy as np
+
+from app.services.match_cache import match_cache
+from app.services.fund_attributes import FundAttributes
+
+# Ponderaciones (semantico, topicos) de cada tipo de match. En /ia/match las
+# reglas suman ademas hasta RULES_WEIGHT
+FUSIONS: Dict[str, tuple[float, float]] = {"funds": (0.3, 0.7), "match": (0.20, 0.55)}
+RULES_WEIGHT = 0.25
+
+# Fondos guardados por idea para cada ponderacion
+AFFINITY_TOP_N = int(os.getenv("AFFINITY_TOP_N", "50"))
+# Ideas por producto de matrices al recalcular (acota la memoria temporal)
+AFFINITY_BLOCK = int(os.getenv("AFFINITY_BLOCK", "1024"))
+
+def _unit(m) -> np.ndarray:
+    m = np.atleast_2d(np.asarray(m, dtype=np.float32))
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+# Filas indexadas por ID con arreglos alineados que crecen al doble
+class _Rows:
+
+    # Constructor de la clase
+    def __init__(self):
+        self.ids: List[Any] = []
+        self.position: Dict[Any, int] = {}
+        self.payloads: List[dict] = []
+        self.arrays: Dict[str, np.ndarray] = {}
+        self._fill: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Declara un arreglo (filas, *tail) con su valor de relleno
+    def declare(self, name: str, tail: tuple, dtype, fill=0):
+        if name not in self.arrays:
+            capacity = max((a.shape[0] for a in self.arrays.values()), default=0)
+            self.arrays[name] = np.full((capacity,) + tail, fill, dtype=dtype)
+            self._fill[name] = fill
+
+    # Filas de los ids (creando las que falten)
+    def add(self, ids: Iterable) -> np.ndarray:
+        for i in ids:
+            if i not in self.position:
+                self.position[i] = len(self.ids)
+                self.ids.append(i)
+                self.payloads.append({})
+        n = len(self.ids)
+        for name, a in self.arrays.items():
+            if a.shape[0] < n:
+                grown = np.full((max(n, 2 * a.shape[0], 64),) + a.shape[1:], self._fill[name], dtype=a.dtype)
+                grown[:a.shape[0]] = a
+                self.arrays[name] = grown
+        return np.array([self.position[i] for i in ids], dtype=np.int64)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name][:len(self.ids)]
+
+# Matriz de afinidad ideas x fondos materializada. Por cada idea guarda los
+# AFFINITY_TOP_N mejores fondos de cada ponderacion de FUSIONS, con sus
+# puntajes semantico y de topicos exactos, y el mayor puntaje de los fondos
+# que quedaron fuera (piso): con el se sabe si un top-k leido es exacto.
+# Se mantiene incremental: una idea nueva se puntua contra todos los fondos
+# y un fondo nuevo o modificado contra todas las ideas, con un producto de
+# matrices cada uno; solo se reordenan las ideas donde el fondo entra o ya
+# estaba. La vigencia se valida con las generaciones de match_cache, por eso
+# solo se activa con un proceso y generaciones locales (ver _enabled_from_env).
+class AffinityStore:
+
+    # Constructor de la clase
+    def __init__(self, top_n: int = AFFINITY_TOP_N, fusions: Dict[str, tuple[float, float]] = FUSIONS,
+                 enabled: bool = True):
+        self.top_n = max(1, top_n)
+        self.fusions = dict(fusions)
+        self.enabled = enabled
+        self.ready = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.funds = _Rows()
+        self.ideas = _Rows()
+        # Atributos categoricos de los fondos, alineados con sus filas
+        self.attributes = FundAttributes()
+        width = self.top_n * len(self.fusions)
+        self.ideas.declare("members", (width,), np.int32, -1)
+        self.ideas.declare("semantic_score", (width,), np.float32)
+        self.ideas.declare("topic_score", (width,), np.float32)
+        self.ideas.declare("floors", (len(self.fusions),), np.float32, -np.inf)
+        self.ideas.declare("gens", (2,), np.int64)
+        # Generacion del catalogo al cargar + escrituras de fondos aplicadas
+        self._catalog_gen = 0
+
+    @staticmethod
+    def _put_vectors(rows: _Rows, ids, semantic, topic) -> np.ndarray:
+        semantic, topic = _unit(semantic), _unit(topic)
+        rows.declare("semantic", semantic.shape[1:], np.float32)
+        rows.declare("topic", topic.shape[1:], np.float32)
+        idx = rows.add(ids)
+        rows.arrays["semantic"][idx] = semantic
+        rows.arrays["topic"][idx] = topic
+        return idx
+
+    # Recalcula los fondos guardados de las filas de ideas dadas
+    def _rank(self, rows: np.ndarray):
+        n_funds = len(self.funds)
+        members = self.ideas.arrays["members"]
+        for start in range(0, len(rows), AFFINITY_BLOCK):
+            block = rows[start:start + AFFINITY_BLOCK]
+            members[block] = -1
+            self.ideas.arrays["floors"][block] = -np.inf
+            if n_funds == 0:
+                continue
+            sem = self.ideas["semantic"][block] @ self.funds["semantic"].T
+            top = self.ideas["topic"][block] @ self.funds["topic"].T
+            n = min(self.top_n, n_funds)
+            picks, floors = [], np.full((len(block), len(self.fusions)), -np.inf, dtype=np.float32)
+            for k, (ws, wt) in enumerate(self.fusions.values()):
+                if n_funds > n:
+                    score = ws * sem + wt * top
+                    part = np.argpartition(-score, n, axis=1)
+                    picks.append(part[:, :n])
+                    floors[:, k] = score[np.arange(len(block)), part[:, n]]
+                else:
+                    picks.append(np.broadcast_to(np.arange(n_funds), (len(block), n_funds)))
+            # Union de los top-n de cada ponderacion, sin repetidos (-1)
+            idx = np.sort(np.concatenate(picks, axis=1), axis=1)
+            idx[:, 1:][idx[:, 1:] == idx[:, :-1]] = -1
+            safe = np.where(idx >= 0, idx, 0)
+            width = idx.shape[1]
+            members[block, :width] = idx
+            self.ideas.arrays["semantic_score"][block, :width] = np.take_along_axis(sem, safe, 1)
+            self.ideas.arrays["topic_score"][block, :width] = np.take_along_axis(top, safe, 1)
+            self.ideas.arrays["floors"][block] = floors
+
+    def _record_gens(self, ids: List, rows: np.ndarray):
+        gens = match_cache.generations("ideas", ids)
+        self.ideas.arrays["gens"][rows] = [g[1:] for g in gens]
+
+    # Carga completa (al iniciar): todos los fondos e ideas
+    def load(self, fund_ids, fund_semantic, fund_topic, fund_payloads, idea_ids, idea_semantic, idea_topic):
+        with self._lock:
+            self._clear()
+            self._catalog_gen = match_cache.catalog_generation()
+            if len(fund_ids):
+                idx = self._put_vectors(self.funds, list(fund_ids), fund_semantic, fund_topic)
+                for r, p in zip(idx, fund_payloads):
+                    self.funds.payloads[r] = p or {}
+                self.attributes.set(idx, fund_payloads)
+            if len(idea_ids):
+                rows = self._put_vectors(self.ideas, list(idea_ids), idea_semantic, idea_topic)
+                self._rank(rows)
+                self._record_gens(list(idea_ids), rows)
+            self.ready = True
+        print(f"Matriz de afinidad: {len(idea_ids)} ideas x {len(fund_ids)} fondos")
+
+    # Ideas nuevas o modificadas: un producto contra todos los fondos
+    def put_ideas(self, ids: List, semantic, topic):
+        if not self.ready:
+            return
+        with self._lock:
+            rows = self._put_vectors(self.ideas, ids, semantic, topic)
+            self._rank(rows)
+            self._record_gens(ids, rows)
+
+    # Fondos nuevos o modificados: un producto contra todas las ideas; se
+    # reordenan las ideas donde algun fondo supera el piso o ya estaba
+    def put_funds(self, ids: List, semantic, topic, payloads: List[dict]):
+        if not self.ready:
+            return
+        with self._lock:
+            fund_rows = self._put_vectors(self.funds, ids, semantic, topic)
+            for r, p in zip(fund_rows, payloads):
+                self.funds.payloads[r] = p or {}
+            self.attributes.set(fund_rows, payloads)
+            if len(self.ideas):
+                sem = self.ideas["semantic"] @ self.funds["semantic"][fund_rows].T
+                top = self.ideas["topic"] @ self.funds["topic"][fund_rows].T
+                floors = self.ideas["floors"]
+                affected = np.isin(self.ideas["members"], fund_rows).any(axis=1)
+                for k, (ws, wt) in enumerate(self.fusions.values()):
+                    affected |= ((ws * sem + wt * top) > floors[:, k, None]).any(axis=1)
+                self._rank(np.flatnonzero(affected))
+            self._catalog_gen += 1
+
+    # Descarta ideas (sin ids: todo el store, p. ej. al recrear la coleccion)
+    def discard(self, collection: str, ids: Iterable | None = None):
+        with self._lock:
+            if collection == "funds" or ids is None:
+                self.ready = False
+                self._clear()
+            elif collection == "ideas":
+                for i in ids:
+                    row = self.ideas.position.get(i)
+                    if row is not None:
+                        self.ideas.arrays["gens"][row] = -1
+
+    # Fondos guardados de la idea: (ids, payloads, semantico (1, m), topicos
+    # (1, m), pisos por ponderacion). None si no esta o esta desactualizada
+    def candidates(self, idea_id):
+        if not (self.enabled and self.ready):
+            return None
+        gens = match_cache.generations("ideas", [idea_id])[0]
+        with self._lock:
+            row = self.ideas.position.get(idea_id)
+            if row is None or gens != [self._catalog_gen, *self.ideas.arrays["gens"][row].tolist()]:
+                self.misses += 1
+                return None
+            members = self.ideas.arrays["members"][row]
+            cols = members >= 0
+            ids = [self.funds.ids[j] for j in members[cols]]
+            payloads = {i: self.funds.payloads[j] for i, j in zip(ids, members[cols])}
+            semantic = self.ideas.arrays["semantic_score"][row, cols][None, :].copy()
+            topic = self.ideas.arrays["topic_score"][row, cols][None, :].copy()
+            floors = dict(zip(self.fusions, self.ideas.arrays["floors"][row].tolist()))
+            self.hits += 1
+        return ids, payloads, semantic, topic, floors
+
+    # Atributos de los fondos dados (alineados con ids), o None si el
+    # catalogo no esta al dia o falta alguno
+    def fund_attributes(self, ids: List) -> FundAttributes | None:
+        if not (self.enabled and self.ready) or match_cache.catalog_generation() != self._catalog_gen:
+            return None
+        with self._lock:
+            rows = [self.funds.position.get(i) for i in ids]
+            if any(r is None for r in rows):
+                return None
+            return self.attributes.take(rows)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled, "ready": self.ready, "top_n": self.top_n,
+            "ideas": len(self.ideas), "funds": len(self.funds),
+            "hits": self.hits, "misses": self.misses,
+        }
+
+# La matriz vive en memoria de cada proceso y solo ve las escrituras que
+# hace ese proceso: se desactiva con QDRANT_MODE=server (varios workers) y con
+# generaciones compartidas (MATCH_CACHE=shared), donde una escritura de otro
+# proceso sube gen:funds sin pasar por put_funds y la dejaria siempre vencida
+def _enabled_from_env() -> bool:
+    if os.getenv("AFFINITY_STORE", "on").lower() == "off":
+        return False
+    if os.getenv("QDRANT_MODE", "memory").lower() == "server" or match_cache.shared:
+        print("Matriz de afinidad desactivada: requiere un solo proceso y MATCH_CACHE local")
+        return False
+    return True
+
+# Matriz de afinidad compartida por todo el proceso (AFFINITY_STORE=off la desactiva)
+affinity_store = AffinityStore(enabled=_enabled_from_env())
@@ -0,0 +1,100 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List
+import numpy as np
+
+from app.services.qdrant_store import aupsert_vectors
+
+# Puntos por lote de escritura (y de vectorizacion en bulk_index)
+BULK_BATCH_SIZE = int(os.getenv("QDRANT_BULK_BATCH", "256"))
+# Lotes escribiendose a la vez antes de que submit espere
+BULK_MAX_INFLIGHT = int(os.getenv("QDRANT_BULK_INFLIGHT", "2"))
+
+# Escritor masivo hacia una coleccion de Qdrant.
+# submit() parte los puntos en lotes y los escribe en segundo plano (sin
+# esperar), limitando los lotes en vuelo; flush() espera a que terminen y
+# reporta puntos por segundo. Usado como contexto, hace flush al salir.
+class BulkWriter:
+
+    # Constructor de la clase
+    def __init__(self, collection: str, batch_size: int = BULK_BATCH_SIZE, max_inflight: int = BULK_MAX_INFLIGHT):
+        self.collection = collection
+        self.batch_size = max(1, batch_size)
+        self.max_inflight = max(1, max_inflight)
+        self._inflight: List[asyncio.Task] = []
+        self._start: float | None = None
+        self.points = 0
+        self.seconds = 0.0
+
+    async def _write(self, ids, vectors, payloads):
+        await aupsert_vectors(self.collection, ids, vectors, payloads)
+        self.points += len(ids)
+
+    # Encola los puntos; solo espera si ya hay max_inflight lotes escribiendose
+    async def submit(
+        self,
+        ids: List[int],
+        vectors: np.ndarray | Dict[str, np.ndarray],
+        payloads: List[Dict[str, Any]],
+    ):
+        if self._start is None:
+            self._start = time.perf_counter()
+        for i in range(0, len(ids), self.batch_size):
+            part = slice(i, i + self.batch_size)
+            if isinstance(vectors, dict):
+                batch = {k: v[part] for k, v in vectors.items()}
+            else:
+                batch = vectors[part]
+            while len(self._inflight) >= self.max_inflight:
+                await self._inflight.pop(0)
+            self._inflight.append(asyncio.create_task(self._write(ids[part], batch, payloads[part])))
+
+    # Espera todas las escrituras pendientes y retorna las estadisticas
+    async def flush(self) -> dict:
+        pending, self._inflight = self._inflight, []
+        results = await asyncio.gather(*pending, return_exceptions=True)
+        if self._start is not None:
+            self.seconds = time.perf_counter() - self._start
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection,
+            "points": self.points,
+            "seconds": round(self.seconds, 3),
+            "points_per_sec": round(self.points / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.flush()
+        else:
+            for task in self._inflight:
+                task.cancel()
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+            self._inflight = []
+
+# Vectoriza e indexa en lotes: mientras se escribe el lote N ya se esta
+# vectorizando el lote N+1. embed recibe los payloads del lote y retorna la
+# matriz (o {nombre: matriz}) de vectores. Retorna las estadisticas de escritura
+async def bulk_index(
+    collection: str,
+    ids: List[int],
+    payloads: List[Dict[str, Any]],
+    embed: Callable[[List[Dict[str, Any]]], Awaitable[np.ndarray | Dict[str, np.ndarray]]],
+    batch_size: int = BULK_BATCH_SIZE,
+) -> dict:
+    async with BulkWriter(collection, batch_size) as writer:
+        for i in range(0, len(ids), batch_size):
+            batch = payloads[i:i + batch_size]
+            await writer.submit(ids[i:i + batch_size], await embed(batch), batch)
+    stats = writer.stats()
+    print(f"Indexados {stats['points']} puntos en {collection} ({stats['points_per_sec']} puntos/s)")
+    return stats
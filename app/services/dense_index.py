@@ -0,0 +1,144 @@
+import functools
+from datetime import datetime, date, timezone
+from typing import Any, Dict, List, Sequence
+import numpy as np
+from qdrant_client.models import (
+    ScoredPoint, Filter, FieldCondition, MatchValue, MatchAny, Range, DatetimeRange
+)
+from app.services.fund_attributes import FundAttributes
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    m = np.ascontiguousarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+# Indice exacto en memoria para colecciones chicas: una matriz float32
+# normalizada y contigua por vector (nombre "" para el vector sin nombre).
+# El top-k sale de un producto de matrices y argpartition, para una o
+# varias consultas a la vez, con los mismos puntajes coseno que Qdrant.
+class DenseIndex:
+
+    # Constructor de la clase
+    def __init__(self, ids: Sequence, vectors: Dict[str, np.ndarray], payloads: List[Dict[str, Any]]):
+        self.ids = list(ids)
+        self.position = {point_id: n for n, point_id in enumerate(self.ids)}
+        self.payloads = payloads
+        self.matrices = {name: _normalize(m) for name, m in vectors.items()}
+
+    # Arma el indice desde los puntos recuperados de Qdrant (con vectores).
+    # Las filas de cada matriz deben calzar con ids y payloads: si algun punto
+    # no tiene todos los vectores con nombre retorna None (se busca en Qdrant)
+    @classmethod
+    def from_records(cls, records) -> "DenseIndex | None":
+        rows = [r.vector if isinstance(r.vector, dict) else {"": r.vector} for r in records]
+        names = {name for vec in rows for name, v in vec.items() if v is not None}
+        if any(vec.get(name) is None for vec in rows for name in names):
+            return None
+        vectors = {name: [vec[name] for vec in rows] for name in names}
+        return cls(
+            [r.id for r in records],
+            {name: np.asarray(v, dtype=np.float32) for name, v in vectors.items()},
+            [r.payload or {} for r in records],
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # Atributos categoricos (bitsets) de los puntos, codificados una vez por indice
+    @functools.cached_property
+    def attributes(self) -> FundAttributes:
+        return FundAttributes.from_payloads(self.payloads)
+
+    # Top-k por consulta. queries: (dim,) o (n, dim); mask: puntos permitidos.
+    # Retorna una lista de hits (ScoredPoint, de mayor a menor) por consulta
+    def search(self, name: str, queries, top_k: int, mask: np.ndarray | None = None) -> List[List[ScoredPoint]]:
+        matrix = self.matrices.get(name)
+        q = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if matrix is None or len(self.ids) == 0:
+            return [[] for _ in range(len(q))]
+        scores = q @ matrix.T
+        available = len(self.ids)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+            available = int(mask.sum())
+        k = min(top_k, available)
+        if k <= 0:
+            return [[] for _ in range(len(q))]
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        rows = np.arange(len(q))[:, None]
+        order = np.argsort(-scores[rows, top], axis=1, kind="stable")
+        top = top[rows, order]
+        return [
+            [ScoredPoint(id=self.ids[j], version=0, score=float(scores[i, j]), payload=self.payloads[j])
+             for j in row]
+            for i, row in enumerate(top)
+        ]
+
+def _as_utc(value) -> datetime | None:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _in_range(value, rng, convert) -> bool:
+    value = convert(value)
+    if value is None:
+        return False
+    bounds = [(rng.gt, lambda a, b: a > b), (rng.gte, lambda a, b: a >= b),
+              (rng.lt, lambda a, b: a < b), (rng.lte, lambda a, b: a <= b)]
+    return all(bound is None or op(value, convert(bound)) for bound, op in bounds)
+
+def _to_number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+# Evalua una condicion sobre un payload (valores lista: basta que uno cumpla).
+# Retorna None si la condicion no esta soportada
+def _matches(payload: dict, cond: FieldCondition) -> bool | None:
+    if not isinstance(cond.match, (MatchValue, MatchAny)) and not isinstance(cond.range, (DatetimeRange, Range)):
+        return None
+    if cond.key not in payload:
+        return False
+    raw = payload[cond.key]
+    values = raw if isinstance(raw, list) else [raw]
+    if isinstance(cond.match, MatchValue):
+        return cond.match.value in values
+    if isinstance(cond.match, MatchAny):
+        return any(v in cond.match.any for v in values)
+    if isinstance(cond.range, DatetimeRange):
+        return any(_in_range(v, cond.range, _as_utc) for v in values)
+    return any(_in_range(v, cond.range, _to_number) for v in values)
+
+# Mascara de puntos que cumplen el filtro (condiciones must de build_filter).
+# Con attributes, las condiciones de igualdad sobre campos codificados se
+# resuelven con bitsets y el resto solo se evalua en los puntos que quedan.
+# Retorna None si el filtro usa algo no soportado: se busca en Qdrant
+def filter_mask(payloads: List[dict], flt: Filter | None, attributes: FundAttributes | None = None) -> np.ndarray | None:
+    mask = np.ones(len(payloads), dtype=bool)
+    if flt is None:
+        return mask
+    if flt.should or flt.must_not or flt.min_should:
+        return None
+    conds = flt.must if isinstance(flt.must, list) else [flt.must] if flt.must else []
+    if not all(isinstance(c, FieldCondition) for c in conds):
+        return None
+    rest = []
+    for c in conds:
+        if attributes is not None and c.key in attributes.fields and isinstance(c.match, (MatchValue, MatchAny)):
+            mask &= attributes.any_of(c.key, [c.match.value] if isinstance(c.match, MatchValue) else c.match.any)
+        else:
+            rest.append(c)
+    for j in np.flatnonzero(mask):
+        for c in rest:
+            ok = _matches(payloads[j], c)
+            if ok is None:
+                return None
+            if not ok:
+                mask[j] = False
+                break
+    return mask
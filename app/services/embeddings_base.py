@@ -1,8 +1,24 @@
 from abc import ABC, abstractmethod
 from typing import Sequence, List
+import numpy as np
 
 class EmbeddingsProvider(ABC):
+    # Modelo y normalizacion usados, identifican el espacio de los vectores
+    model_name: str = ""
+    normalize: bool = True
+
     @abstractmethod
-    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
-        """Un embedding por texto, en el mismo orden."""
+    async def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        """Matriz float32 (n, dim), una fila por texto, en el mismo orden."""
         raise NotImplementedError
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Un embedding por texto, en el mismo orden (listas de Python)."""
+        return (await self.embed_array(texts)).tolist()
+
+    def stats(self) -> dict:
+        """Contadores del proveedor (cache, lotes, etc.)."""
+        return {}
+
+    def close(self):
+        """Libera recursos del proveedor (procesos, archivos, etc.)."""
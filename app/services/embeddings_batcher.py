@@ -0,0 +1,93 @@
+import asyncio
+from typing import Sequence
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+
+# Proveedor que agrupa llamadas concurrentes a embed() en un solo lote.
+# Espera hasta max_wait_ms (o hasta juntar max_batch textos), hace un unico
+# encode y reparte los resultados. Textos identicos en vuelo se calculan una vez.
+class BatchingEmbeddings(EmbeddingsProvider):
+
+    # Constructor de la clase
+    def __init__(self, inner: EmbeddingsProvider, max_wait_ms: float = 5.0, max_batch: int = 64):
+        self.inner = inner
+        self.model_name = inner.model_name
+        self.normalize = inner.normalize
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch = max_batch
+        # Textos esperando el proximo lote y textos ya enviados al modelo
+        self._pending: dict[str, asyncio.Future] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        # Referencias a los lotes en curso (el loop solo guarda referencias debiles)
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.requests = 0
+        self.merged = 0
+
+    async def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        # Las cargas masivas ya vienen en lote, pasan directo
+        if len(texts) >= self.max_batch or not texts:
+            return await self.inner.embed_array(texts)
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        futures = []
+        for t in texts:
+            fut = self._pending.get(t) or self._inflight.get(t)
+            if fut is None:
+                fut = loop.create_future()
+                self._pending[t] = fut
+            else:
+                self.merged += 1
+            futures.append(fut)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        # shield: si un cliente cancela, no se cancela el futuro compartido
+        return np.stack(await asyncio.gather(*(asyncio.shield(f) for f in futures)))
+
+    # Envia los textos pendientes como un lote al proveedor interno
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[str, asyncio.Future]):
+        texts = list(batch)
+        self.batches += 1
+        try:
+            vectors = await self.inner.embed_array(texts)
+        except Exception as e:
+            for fut in batch.values():
+                if not fut.done():
+                    fut.set_exception(e)
+        else:
+            for fut, vec in zip(batch.values(), vectors):
+                if not fut.done():
+                    fut.set_result(vec)
+        finally:
+            # Lote cancelado (p. ej. al apagar): nadie queda esperando para siempre
+            for fut in batch.values():
+                if not fut.done():
+                    fut.cancel()
+            for t in texts:
+                if self._inflight.get(t) is batch[t]:
+                    del self._inflight[t]
+
+    def stats(self) -> dict:
+        return {
+            **self.inner.stats(),
+            "batching": {"requests": self.requests, "batches": self.batches, "merged": self.merged},
+        }
+
+    def close(self):
+        self.inner.close()
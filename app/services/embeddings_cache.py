@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import hashlib
+import itertools
+import threading
+from typing import Sequence, List
+import anyio
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin locks, un solo proceso por carpeta
+    fcntl = None
+
+# Segundos maximos entre escrituras a disco del indice y la matriz
+FLUSH_SECONDS = float(os.getenv("EMBEDDINGS_CACHE_FLUSH_SECONDS", "5"))
+
+# Cache en disco de embeddings, direccionado por contenido.
+# Las filas viven en una matriz float32 memory-mapped ({namespace}.f32) y el
+# indice texto -> fila en un JSON ({namespace}.json). El namespace se deriva
+# del modelo y del flag de normalizacion, asi que cambiar cualquiera de los
+# dos invalida el cache completo sin tener que borrar archivos.
+# Cada proceso (p. ej. cada worker de uvicorn) toma con un lock exclusivo su
+# propio shard de archivos ({namespace}-{n}), asi dos procesos nunca escriben
+# las mismas filas; al reiniciar se vuelve a tomar el primer shard libre.
+# Las escrituras a disco se agrupan: como mucho cada flush_seconds.
+class EmbeddingCache:
+
+    # Constructor de la clase
+    def __init__(self, folder: str, model_name: str, normalize: bool, max_items: int = 50000,
+                 flush_seconds: float = FLUSH_SECONDS):
+        self.folder = folder
+        self.max_items = max_items
+        self.flush_seconds = flush_seconds
+        namespace = hashlib.sha1(f"{model_name}|{int(normalize)}".encode("utf-8")).hexdigest()[:16]
+        os.makedirs(folder, exist_ok=True)
+        self._lock_file, shard = self._claim_shard(folder, namespace)
+        self._data_path = os.path.join(folder, f"{shard}.f32")
+        self._index_path = os.path.join(folder, f"{shard}.json")
+        self._lock = threading.Lock()
+        # Serializa los flush (la escritura a disco corre sin self._lock)
+        self._flush_lock = threading.Lock()
+        self._matrix: np.memmap | None = None
+        self._dim: int | None = None
+        # hash del texto -> [fila, ultimo uso]
+        self._index: dict[str, list[int]] = {}
+        self._free: list[int] = []
+        # Filas desalojadas que el indice en disco aun podria referenciar
+        self._quarantine: list[int] = []
+        self._tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        self._load()
+
+    # Toma el primer shard que ningun otro proceso tenga bloqueado
+    @staticmethod
+    def _claim_shard(folder: str, namespace: str):
+        if fcntl is None:
+            return None, f"{namespace}-0"
+        for n in itertools.count():
+            handle = open(os.path.join(folder, f"{namespace}-{n}.lock"), "a")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return handle, f"{namespace}-{n}"
+            except OSError:
+                handle.close()
+
+    # Hash estable de un texto
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # Recupera el indice y la matriz persistidos, si existen
+    def _load(self):
+        if not (os.path.exists(self._index_path) and os.path.exists(self._data_path)):
+            return
+        try:
+            with open(self._index_path) as f:
+                meta = json.load(f)
+            if meta.get("max_items") != self.max_items:
+                return
+            self._dim = int(meta["dim"])
+            self._index = {k: list(v) for k, v in meta["index"].items()}
+            self._tick = int(meta.get("tick", 0))
+            self._matrix = np.memmap(self._data_path, dtype=np.float32, mode="r+",
+                                     shape=(self.max_items, self._dim))
+            used = {slot for slot, _ in self._index.values()}
+            self._free = [s for s in range(self.max_items - 1, -1, -1) if s not in used]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Cache de embeddings corrupto, se reinicia: {e}")
+            self._index, self._matrix, self._dim = {}, None, None
+
+    # Crea la matriz en disco la primera vez que se conoce la dimension
+    def _ensure_matrix(self, dim: int):
+        if self._matrix is None:
+            self._dim = dim
+            self._matrix = np.memmap(self._data_path, dtype=np.float32, mode="w+",
+                                     shape=(self.max_items, dim))
+            self._free = list(range(self.max_items - 1, -1, -1))
+            self._quarantine = []
+            self._index = {}
+
+    # Busca los textos en el cache. Retorna las filas encontradas (None si falta)
+    def get_many(self, texts: Sequence[str]) -> List[np.ndarray | None]:
+        out: List[np.ndarray | None] = []
+        with self._lock:
+            for t in texts:
+                entry = self._index.get(self.key(t)) if self._matrix is not None else None
+                if entry is None:
+                    self.misses += 1
+                    out.append(None)
+                    continue
+                self._tick += 1
+                entry[1] = self._tick
+                self.hits += 1
+                out.append(np.array(self._matrix[entry[0]]))
+        return out
+
+    # Guarda nuevos embeddings, desalojando los menos usados si se llena.
+    # Si hay que desalojar, primero se persiste el indice sin las entradas
+    # desalojadas y recien entonces se reutilizan sus filas
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        if len(texts) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        pending = list(zip(texts, vectors))
+        while pending:
+            with self._lock:
+                self._ensure_matrix(vectors.shape[1])
+                if vectors.shape[1] != self._dim:
+                    raise ValueError(f"Dimension {vectors.shape[1]} no coincide con el cache ({self._dim})")
+                pending = self._write(pending)
+                due = bool(pending) or time.monotonic() - self._flushed_at >= self.flush_seconds
+            if due:
+                self.flush()
+
+    # Escribe las filas mientras haya libres; retorna las que faltan
+    def _write(self, pending: list) -> list:
+        for n, (t, vec) in enumerate(pending):
+            k = self.key(t)
+            entry = self._index.get(k)
+            if entry is None:
+                if not self._free:
+                    self._evict(max(1, self.max_items // 10))
+                    return pending[n:]
+                entry = [self._free.pop(), 0]
+                self._index[k] = entry
+            self._tick += 1
+            entry[1] = self._tick
+            self._matrix[entry[0]] = vec
+            self._dirty = True
+        return []
+
+    # Libera las n entradas usadas hace mas tiempo. Sus filas quedan en
+    # cuarentena hasta que un flush persista el indice sin ellas: si el
+    # proceso cae antes, el indice en disco nunca apunta a una fila reescrita
+    def _evict(self, n: int):
+        oldest = sorted(self._index.items(), key=lambda kv: kv[1][1])[:n]
+        for k, (slot, _) in oldest:
+            del self._index[k]
+            self._quarantine.append(slot)
+        self.evictions += len(oldest)
+        self._dirty = True
+
+    # Persiste la matriz y el indice (escritura atomica del indice). El
+    # indice se copia bajo el lock y la escritura a disco ocurre fuera de
+    # el, asi las lecturas (get_many) no esperan al disco
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if self._matrix is None or not self._dirty:
+                    return
+                released, self._quarantine = self._quarantine, []
+                self._dirty = False
+                self._flushed_at = time.monotonic()
+                meta = json.dumps({
+                    "dim": self._dim,
+                    "max_items": self.max_items,
+                    "tick": self._tick,
+                    "index": self._index,
+                })
+                matrix = self._matrix
+            try:
+                matrix.flush()
+                tmp = self._index_path + ".tmp"
+                with open(tmp, "w") as f:
+                    f.write(meta)
+                os.replace(tmp, self._index_path)
+            except OSError:
+                with self._lock:
+                    self._quarantine.extend(released)
+                    self._dirty = True
+                raise
+            with self._lock:
+                self._free.extend(released)
+
+    # Persiste lo pendiente y libera el shard para otro proceso
+    def close(self):
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # Contadores de uso del cache
+    def stats(self) -> dict:
+        return {
+            "items": len(self._index),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# Proveedor que antepone el cache en disco a otro proveedor.
+# Solo los textos que no estan en cache pasan por el modelo.
+class CachedEmbeddings(EmbeddingsProvider):
+
+    # Constructor de la clase
+    def __init__(self, inner: EmbeddingsProvider, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+        self.model_name = inner.model_name
+        self.normalize = inner.normalize
+
+    async def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        found = self.cache.get_many(texts)
+        # Textos faltantes, sin repetir
+        missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+        if missing:
+            vectors = await self.inner.embed_array(missing)
+            # La escritura (y el flush periodico) no corre en el event loop
+            await anyio.to_thread.run_sync(self.cache.put_many, missing, vectors)
+            fresh = dict(zip(missing, vectors))
+            found = [v if v is not None else fresh[t] for t, v in zip(texts, found)]
+        if not found:
+            return np.zeros((0, self.cache._dim or 0), dtype=np.float32)
+        return np.stack(found).astype(np.float32, copy=False)
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "cache": self.cache.stats()}
+
+    def close(self):
+        self.cache.close()
+        self.inner.close()
@@ -1,10 +1,56 @@
 import os
 from app.services.embeddings_base import EmbeddingsProvider
+from app.services.embeddings_cache import EmbeddingCache, CachedEmbeddings
+from app.services.embeddings_batcher import BatchingEmbeddings
 from app.services.providers.sbert_embeddings import SBertEmbeddings
 
+# Crea el proveedor base (sin cache ni agrupacion) segun su nombre
+def build_provider(name: str) -> EmbeddingsProvider:
+    name = name.lower()
+    if name == "sbert":
+        return SBertEmbeddings()
+    if name == "onnx":
+        # Import diferido: onnxruntime/optimum son opcionales
+        from app.services.providers.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    if name == "multiprocess":
+        from app.services.providers.multiprocess_embeddings import MultiProcessEmbeddings
+        return MultiProcessEmbeddings()
+    raise ValueError(f"Proveedor no soportado: {name}")
+
+# Antepone al proveedor base la agrupacion de llamadas y el cache en disco
+def _wrap(base: EmbeddingsProvider) -> EmbeddingsProvider:
+    result = base
+    # Agrupa llamadas concurrentes de un solo texto (0 para desactivarlo)
+    wait_ms = float(os.getenv("EMBEDDINGS_BATCH_WAIT_MS", "5"))
+    if wait_ms > 0:
+        result = BatchingEmbeddings(
+            result,
+            max_wait_ms=wait_ms,
+            max_batch=int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32")),
+        )
+    # Cache en disco delante del modelo (vacio para desactivarlo)
+    cache_dir = os.getenv("EMBEDDINGS_CACHE_DIR", "./.embeddings_cache")
+    if cache_dir:
+        cache = EmbeddingCache(
+            cache_dir,
+            model_name=base.model_name,
+            normalize=base.normalize,
+            max_items=int(os.getenv("EMBEDDINGS_CACHE_MAX_ITEMS", "50000")),
+        )
+        result = CachedEmbeddings(result, cache)
+    return result
+
 # Carga el proveedor de los embeddings
 def get_embeddings_provider() -> EmbeddingsProvider:
-    provider = os.getenv("EMBEDDINGS_PROVIDER", "sbert").lower()
-    if provider == "sbert":
-        return SBertEmbeddings()
-    raise ValueError(f"Proveedor no soportado: {provider}")
+    return _wrap(build_provider(os.getenv("EMBEDDINGS_PROVIDER", "sbert")))
+
+# Encoder del modelo de topicos. Si es el mismo modelo que el semantico se
+# reutiliza el proveedor semantico, y con el su cache; si no, se crea un
+# proveedor propio con su propio cache en disco (el modelo de topicos se
+# entreno con los embeddings de TOPIC_EMBEDDINGS_MODEL).
+def get_topic_encoder(provider: EmbeddingsProvider) -> EmbeddingsProvider:
+    name = os.getenv("TOPIC_EMBEDDINGS_MODEL", "jinaai/jina-embeddings-v2-base-es")
+    if name == provider.model_name:
+        return provider
+    return _wrap(SBertEmbeddings(model_name=name, trust_remote_code=True))
@@ -0,0 +1,79 @@
+from typing import Any, Dict, Iterable, List, Sequence
+import numpy as np
+
+# Campos categoricos del payload de los fondos (Instrumento) que se codifican
+# como bitsets. El modelo no trae regiones, asi que no se codifican
+ATTRIBUTE_FIELDS = ("TipoDePerfil", "Estado", "TipoDeBeneficio")
+
+def _values(raw) -> list:
+    values = raw if isinstance(raw, list) else [] if raw is None else [raw]
+    return [v for v in values if isinstance(v, (str, int, float, bool))]
+
+# Atributos categoricos de los fondos codificados una vez como bitsets: por
+# campo, una matriz uint64 (fondos, palabras) con un bit por valor del
+# vocabulario. Preguntar si un fondo tiene alguno de ciertos valores es un
+# AND y un any sobre toda la matriz, en vez de armar sets por payload.
+class FundAttributes:
+
+    # Constructor de la clase
+    def __init__(self, fields: Sequence[str] = ATTRIBUTE_FIELDS):
+        self.fields = tuple(fields)
+        self.vocab: Dict[str, Dict[Any, int]] = {f: {} for f in self.fields}
+        self.bits: Dict[str, np.ndarray] = {f: np.zeros((0, 1), dtype=np.uint64) for f in self.fields}
+        self.size = 0
+
+    @classmethod
+    def from_payloads(cls, payloads: List[dict], fields: Sequence[str] = ATTRIBUTE_FIELDS) -> "FundAttributes":
+        attrs = cls(fields)
+        attrs.set(np.arange(len(payloads)), payloads)
+        return attrs
+
+    def __len__(self) -> int:
+        return self.size
+
+    # Codifica (o recodifica) los payloads en las filas dadas
+    def set(self, rows, payloads: List[dict]):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+        self.size = max(self.size, int(rows.max()) + 1)
+        for f in self.fields:
+            vocab = self.vocab[f]
+            codes = [[vocab.setdefault(v, len(vocab)) for v in _values((p or {}).get(f))] for p in payloads]
+            words = max(1, (len(vocab) + 63) // 64)
+            bits = self.bits[f]
+            if bits.shape[0] < self.size or bits.shape[1] < words:
+                capacity = bits.shape[0] if bits.shape[0] >= self.size else max(self.size, 2 * bits.shape[0])
+                grown = np.zeros((capacity, max(words, bits.shape[1])), dtype=np.uint64)
+                grown[:bits.shape[0], :bits.shape[1]] = bits
+                self.bits[f] = bits = grown
+            bits[rows] = 0
+            flat = np.fromiter((c for cs in codes for c in cs), dtype=np.int64)
+            owners = np.repeat(rows, [len(cs) for cs in codes])
+            np.bitwise_or.at(bits, (owners, flat // 64), np.left_shift(np.uint64(1), (flat % 64).astype(np.uint64)))
+
+    # Bits de los valores pedidos (los que no estan codificados no suman)
+    def query(self, field: str, values: Iterable) -> np.ndarray:
+        q = np.zeros(self.bits[field].shape[1], dtype=np.uint64)
+        for v in _values(list(values)):
+            code = self.vocab[field].get(v)
+            if code is not None and code // 64 < len(q):
+                q[code // 64] |= np.uint64(1) << np.uint64(code % 64)
+        return q
+
+    # Fondos que tienen alguno de los valores
+    def any_of(self, field: str, values: Iterable) -> np.ndarray:
+        return (self.bits[field][:self.size] & self.query(field, values)).any(axis=1)
+
+    # Fondos que declaran algun valor en el campo
+    def declares(self, field: str) -> np.ndarray:
+        return self.bits[field][:self.size].any(axis=1)
+
+    # Subconjunto de filas (mismo vocabulario), p. ej. los candidatos de un match
+    def take(self, rows) -> "FundAttributes":
+        rows = np.asarray(rows, dtype=np.int64)
+        out = FundAttributes(self.fields)
+        out.vocab = self.vocab
+        out.bits = {f: b[rows] for f, b in self.bits.items()}
+        out.size = len(rows)
+        return out
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import hashlib
+import functools
+import threading
+import anyio
+from collections import OrderedDict
+from typing import Any, Iterable
+
+# Backend local (por proceso): LRU con TTL para resultados y contadores de
+# generacion en un diccionario. Seguro entre threads (las escrituras a
+# Qdrant corren fuera del event loop).
+class LocalBackend:
+    shared = False
+
+    # Constructor de la clase
+    def __init__(self, max_items: int = 10000):
+        self.max_items = max_items
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def counters(self, names: list[str]) -> list[int]:
+        with self._lock:
+            return [self._counters.get(n, 0) for n in names]
+
+    def incr(self, names: Iterable[str]):
+        with self._lock:
+            for n in names:
+                self._counters[n] = self._counters.get(n, 0) + 1
+
+    def stats(self) -> dict:
+        return {"backend": "local", "items": len(self._data)}
+
+# Backend compartido entre workers/instancias sobre Redis (dependencia opcional)
+class RedisBackend:
+    shared = True
+
+    # Constructor de la clase
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+        self.url = url
+
+    def get(self, key: str):
+        raw = self._redis.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key: str, value, ttl: float):
+        self._redis.set(key, json.dumps(value, ensure_ascii=False), ex=max(1, int(ttl)))
+
+    def counters(self, names: list[str]) -> list[int]:
+        return [int(v or 0) for v in self._redis.mget(names)]
+
+    def incr(self, names: Iterable[str]):
+        pipe = self._redis.pipeline()
+        for n in names:
+            pipe.incr(n)
+        pipe.execute()
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "items": self._redis.dbsize()}
+
+# Cache de resultados de match. La clave combina el ID de la idea (o
+# proyecto), su generacion, la generacion del catalogo de fondos y un hash
+# de los parametros. Cada escritura en Qdrant sube el contador que
+# corresponde (touch), asi una actualizacion invalida sin recorrer claves:
+# las entradas viejas simplemente dejan de consultarse y expiran por TTL.
+class MatchCache:
+
+    # Constructor de la clase
+    def __init__(self, backend, ttl_seconds: float = 3600.0, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    # Si las generaciones son visibles para todos los procesos
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    # Crea el cache segun MATCH_CACHE (local|shared|off) y MATCH_CACHE_URL.
+    # Con QDRANT_MODE=server (varios workers sobre el mismo Qdrant) los
+    # contadores locales no ven las escrituras de los otros procesos: si el
+    # backend compartido no esta disponible se falla al iniciar, y el local
+    # acota su TTL a MATCH_CACHE_LOCAL_TTL_SECONDS. Fuera de server, si Redis
+    # no esta disponible se usa el local
+    @classmethod
+    def from_env(cls) -> "MatchCache":
+        mode = os.getenv("MATCH_CACHE", "local").lower()
+        server = os.getenv("QDRANT_MODE", "memory").lower() == "server"
+        ttl = float(os.getenv("MATCH_CACHE_TTL_SECONDS", "3600"))
+        local = LocalBackend(int(os.getenv("MATCH_CACHE_MAX_ITEMS", "10000")))
+        if mode == "shared":
+            url = os.getenv("MATCH_CACHE_URL", "redis://localhost:6379/0")
+            try:
+                return cls(RedisBackend(url), ttl)
+            except Exception as e:
+                if server:
+                    raise RuntimeError(f"MATCH_CACHE=shared con QDRANT_MODE=server y Redis no disponible: {e}") from e
+                print(f"Cache de match compartido no disponible ({e}); se usa el local")
+        if server and mode != "off":
+            ttl = min(ttl, float(os.getenv("MATCH_CACHE_LOCAL_TTL_SECONDS", "30")))
+            print(f"Cache de match local con QDRANT_MODE=server: TTL acotado a {ttl:g}s")
+        return cls(local, ttl, enabled=mode != "off")
+
+    @staticmethod
+    def _generation(collection: str, item=None) -> str:
+        return f"gen:{collection}" if item is None else f"gen:{collection}:{item}"
+
+    # Generacion del catalogo de fondos
+    def catalog_generation(self) -> int:
+        return self.backend.counters([self._generation("funds")])[0]
+
+    # Generaciones vigentes [catalogo, coleccion, item] de cada item
+    def generations(self, collection: str, item_ids: Iterable) -> list[list[int]]:
+        counters = self.backend.counters(
+            [self._generation("funds"), self._generation(collection)]
+            + [self._generation(collection, i) for i in item_ids]
+        )
+        return [counters[:2] + [c] for c in counters[2:]]
+
+    # Clave del resultado; se calcula antes de hacer el match, asi un
+    # resultado calculado durante una escritura queda bajo la version anterior
+    def key(self, collection: str, item_id, params: dict) -> str:
+        return self.keys(collection, [item_id], params)[0]
+
+    # Claves de varios items con una sola lectura de generaciones
+    def keys(self, collection: str, item_ids: Iterable, params: dict) -> list[str]:
+        item_ids = list(item_ids)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        return [f"match:{collection}:{i}:{'.'.join(map(str, gens))}:{digest}"
+                for i, gens in zip(item_ids, self.generations(collection, item_ids))]
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        if self.enabled:
+            self.backend.set(key, value, self.ttl)
+
+    # Versiones para los endpoints async: con Redis cada llamada es I/O
+    # bloqueante y corre en un thread (como qdrant_store._run); el backend
+    # local responde en memoria y se llama directo
+    async def _call(self, fn, *args):
+        if not self.backend.shared:
+            return fn(*args)
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args))
+
+    async def akeys(self, collection: str, item_ids: Iterable, params: dict) -> list[str]:
+        return await self._call(self.keys, collection, list(item_ids), params)
+
+    async def akey(self, collection: str, item_id, params: dict) -> str:
+        return (await self.akeys(collection, [item_id], params))[0]
+
+    async def aget_many(self, keys: list[str]) -> list:
+        return await self._call(lambda: [self.get(k) for k in keys])
+
+    async def aget(self, key: str):
+        return (await self.aget_many([key]))[0]
+
+    async def aput(self, key: str, value):
+        await self._call(self.put, key, value)
+
+    # Registra una escritura: sin ids se invalida toda la coleccion. Cualquier
+    # cambio en funds invalida todos los matches (generacion del catalogo)
+    def touch(self, collection: str, ids: Iterable | None = None):
+        if ids is None or collection == "funds":
+            self.backend.incr([self._generation(collection)])
+        else:
+            self.backend.incr([self._generation(collection, i) for i in ids])
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "enabled": self.enabled, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+# Cache compartido por todo el proceso
+match_cache = MatchCache.from_env()
@@ -0,0 +1,141 @@
+import os
+from typing import List
+import numpy as np
+from qdrant_client.models import Filter
+
+from app.models.match_result import MatchResult
+from app.services.qdrant_store import SEMANTIC, TOPIC, asearch_funds_hybrid_batch, apoint_vectors, fund_attributes
+from app.services.affinity_store import affinity_store, FUSIONS, RULES_WEIGHT
+from app.services.dense_index import filter_mask
+
+# Candidatos por busqueda = top_k * MATCH_OVERFETCH (primera etapa)
+MATCH_OVERFETCH = max(1, int(os.getenv("MATCH_OVERFETCH", "4")))
+
+# Reglas: (campo del request, campo del payload del fondo, penalizacion, nota).
+# Solo campos que existen en Instrumento y estan en ATTRIBUTE_FIELDS; las
+# regiones del request se aplican como filtro cuando el payload las trae
+RULES = [
+    ("tipos_perfil", "TipoDePerfil", 0.4, "Tipo de perfil no coincide"),
+]
+
+def _unit(m) -> np.ndarray:
+    m = np.atleast_2d(np.asarray(m, dtype=np.float32))
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return m / np.where(norms == 0, 1, norms)
+
+# Matching en dos etapas. Primero se piden top_k * MATCH_OVERFETCH
+# candidatos a cada indice (semantico y de topicos); luego se calculan los
+# dos puntajes exactos de todos los candidatos con los vectores guardados,
+# en un solo producto de matrices. Asi un fondo que aparece en una sola
+# busqueda no queda con 0 en la otra. Retorna los ids, sus payloads, los
+# puntajes (consultas x candidatos) y la mascara de candidatos por consulta
+async def match_candidates(semantic_queries, topic_queries, top_k: int, qf: Filter | None):
+    semantic_queries, topic_queries = _unit(semantic_queries), _unit(topic_queries)
+    rows = await asearch_funds_hybrid_batch(
+        semantic_queries, topic_queries, top_k=top_k * MATCH_OVERFETCH, must_filter=qf,
+    )
+    payloads = {}
+    for hits, hits_topic in rows:
+        for h in list(hits_topic) + list(hits):
+            payloads[int(h.id)] = h.payload or {}
+    ids = list(payloads)
+    pos = {call_id: n for n, call_id in enumerate(ids)}
+    seen = np.zeros((len(rows), len(ids)), dtype=bool)
+    for r, (hits, hits_topic) in enumerate(rows):
+        seen[r, [pos[int(h.id)] for h in list(hits) + list(hits_topic)]] = True
+    if not ids:
+        empty = np.zeros(seen.shape, dtype=np.float32)
+        return ids, payloads, empty, empty, seen
+    stored = await apoint_vectors("funds", ids, [SEMANTIC, TOPIC])
+    semantic = semantic_queries @ stored[SEMANTIC].T
+    topic = topic_queries @ stored[TOPIC].T
+    return ids, payloads, semantic, topic, seen
+
+# Pondera los matchs de /ia/{id}/{k}, sin reglas (una fila por consulta)
+def compute_match_score(ids, payloads, semantic, topic, seen, k: int) -> List[List[MatchResult]]:
+    # Calculamos la afinidad de todos los candidatos de una vez
+    ws, wt = FUSIONS["funds"]
+    affinity = ws * semantic + wt * topic
+    affinity[~seen] = -np.inf
+    # Retornamos los k elementos de mayor afinidad
+    order = np.argsort(-affinity, axis=1, kind="stable")[:, :k]
+    return [[MatchResult(
+        call_id=ids[j],
+        name=payloads[ids[j]].get("Titulo", "Fondo"),
+        agency=str(payloads[ids[j]].get("Financiador")) if payloads[ids[j]].get("Financiador") else None,
+        affinity=float(affinity[r, j]),
+        semantic_score=float(semantic[r, j]),
+        rules_score=float(0.0),
+        topic_score=float(topic[r, j]),
+        explanations=[""]
+    ) for j in row if seen[r, j]] for r, row in enumerate(order)]
+
+# Puntaje de reglas de todos los candidatos a la vez, con los bitsets de
+# atributos: un fondo se penaliza si declara valores y ninguno coincide
+def rules_scores(attributes, req) -> tuple[np.ndarray, List[List[str]]]:
+    score = np.ones(len(attributes), dtype=np.float32)
+    notes: List[List[str]] = [[] for _ in range(len(attributes))]
+    for wanted, field, penalty, note in RULES:
+        values = getattr(req, wanted)
+        if values:
+            miss = attributes.declares(field) & ~attributes.any_of(field, values)
+            score[miss] -= penalty
+            for j in np.flatnonzero(miss):
+                notes[j].append(note)
+    return np.clip(score, 0.0, 1.0), notes
+
+# Pondera los candidatos de varias ideas a la vez con matrices (ideas x
+# candidatos), ya con los puntajes exactos de match_candidates. Las reglas
+# dependen solo del fondo y del request, asi que se calculan una vez
+def rank_matches(ids, payloads, semantic, topic, seen, req, attributes=None) -> List[List[MatchResult]]:
+    if attributes is None:
+        attributes = fund_attributes(ids, payloads)
+    rules, notes = rules_scores(attributes, req)
+    ws, wt = FUSIONS["match"]
+    affinity = ws * semantic + RULES_WEIGHT * rules[None, :] + wt * topic
+    affinity[~seen] = -np.inf
+    order = np.argsort(-affinity, axis=1, kind="stable")[:, :req.top_k]
+    out: List[List[MatchResult]] = []
+    for r, row in enumerate(order):
+        out.append([MatchResult(
+            call_id=ids[j],
+            name=payloads[ids[j]].get("Titulo", "Fondo"),
+            agency=str(payloads[ids[j]].get("Financiador")) if payloads[ids[j]].get("Financiador") is not None else None,
+            affinity=float(affinity[r, j]),
+            semantic_score=float(semantic[r, j]),
+            rules_score=float(rules[j]),
+            explanations=notes[j],
+            topic_score=float(topic[r, j])
+        ) for j in row if seen[r, j]])
+    return out
+
+# Matches de /ia/match para una o varias ideas (una fila por idea)
+async def match_ideas(semantic_queries, topic_queries, req, qf: Filter | None) -> List[List[MatchResult]]:
+    return rank_matches(*await match_candidates(semantic_queries, topic_queries, req.top_k, qf), req)
+
+# Matches de /ia/{id}/{k} para una o varias consultas (sin filtros ni reglas)
+async def match_funds(semantic_queries, topic_queries, k: int) -> List[List[MatchResult]]:
+    return compute_match_score(*await match_candidates(semantic_queries, topic_queries, k, None), k)
+
+# Sirve el match desde la matriz de afinidad materializada (sin req: la
+# ponderacion de /ia/{id}/{k}). Retorna None si la idea no esta o esta
+# desactualizada, si el filtro no se puede evaluar en memoria, o si algun
+# fondo no guardado podria entrar al top (su afinidad maxima es el piso)
+def match_from_store(idea_id: int, k: int, req=None, qf: Filter | None = None) -> List[MatchResult] | None:
+    stored = affinity_store.candidates(idea_id)
+    if stored is None:
+        return None
+    ids, payloads, semantic, topic, floors = stored
+    attributes = fund_attributes(ids, payloads)
+    seen = filter_mask([payloads[i] for i in ids], qf, attributes)
+    if seen is None:
+        return None
+    if req is None:
+        out = compute_match_score(ids, payloads, semantic, topic, seen[None, :], k)[0]
+        floor = floors["funds"]
+    else:
+        out = rank_matches(ids, payloads, semantic, topic, seen[None, :], req, attributes)[0]
+        floor = floors["match"] + RULES_WEIGHT
+    if floor == -np.inf or (out and len(out) == k and out[-1].affinity >= floor):
+        return out
+    return None
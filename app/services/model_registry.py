@@ -0,0 +1,98 @@
+import os
+import threading
+from sentence_transformers import SentenceTransformer
+
+# Registro central de modelos SentenceTransformer.
+# Carga cada modelo una sola vez por proceso (clave: nombre, dispositivo y
+# backend), aplica la configuracion de threads de torch y lleva la cuenta de
+# referencias, de modo que el modelo de topicos y el proveedor semantico
+# comparten el mismo encoder cuando apuntan al mismo modelo.
+class ModelRegistry:
+
+    # Constructor de la clase
+    def __init__(self):
+        self._lock = threading.Lock()
+        # clave -> [modelo, referencias]
+        self._models: dict[tuple, list] = {}
+        self._threads_set = False
+
+    @staticmethod
+    def _key(name: str, device: str, backend: str, model_kwargs: dict | None) -> tuple:
+        return (name, device, backend, (model_kwargs or {}).get("file_name"))
+
+    # Limita los threads de torch una vez, antes de cargar el primer modelo
+    def _configure_threads(self):
+        if self._threads_set:
+            return
+        threads = int(os.getenv("TORCH_NUM_THREADS", "0"))
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        self._threads_set = True
+
+    # Retorna el modelo (cargandolo si hace falta) y suma una referencia
+    def acquire(
+        self,
+        name: str,
+        device: str = "cpu",
+        backend: str = "torch",
+        model_kwargs: dict | None = None,
+        trust_remote_code: bool = False,
+        local_files_only: bool = False,
+    ) -> SentenceTransformer:
+        key = self._key(name, device, backend, model_kwargs)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None:
+                self._configure_threads()
+                print(f"Cargando modelo {name} ({backend}, {device})...")
+                model = SentenceTransformer(
+                    name,
+                    device=device,
+                    backend=backend,
+                    model_kwargs=model_kwargs,
+                    trust_remote_code=trust_remote_code,
+                    cache_folder=os.getenv("TRANSFORMERS_CACHE", None),
+                    local_files_only=local_files_only,
+                )
+                entry = [model, 0]
+                self._models[key] = entry
+            entry[1] += 1
+            return entry[0]
+
+    # Resta una referencia; el modelo se descarga cuando nadie lo usa
+    def release(self, model: SentenceTransformer):
+        with self._lock:
+            for key, entry in list(self._models.items()):
+                if entry[0] is model:
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self._models[key]
+                    return
+
+    # Bytes aproximados del modelo: parametros + buffers con torch; con
+    # ONNX/OpenVINO el tamano del archivo exportado (y sus datos externos).
+    # None si no se puede estimar
+    @staticmethod
+    def _model_bytes(model, backend: str) -> int | None:
+        if backend == "torch":
+            return sum(t.numel() * t.element_size()
+                       for t in list(model.parameters()) + list(model.buffers()))
+        try:
+            path = str(model[0].auto_model.model_path)
+            return sum(os.path.getsize(p) for p in (path, path + "_data") if os.path.exists(p)) or None
+        except (AttributeError, IndexError, KeyError, TypeError, OSError):
+            return None
+
+    # Memoria aproximada y referencias por modelo ("n/a" si no se puede estimar)
+    def memory_report(self) -> dict:
+        report = {}
+        with self._lock:
+            for (name, device, backend, file_name), (model, refs) in self._models.items():
+                size = self._model_bytes(model, backend)
+                label = f"{name} [{backend}/{device}]" + (f" {file_name}" if file_name else "")
+                report[label] = {"refs": refs, "memory_mb": round(size / 2**20, 1) if size is not None else "n/a"}
+        return report
+
+# Registro compartido por todo el proceso
+registry = ModelRegistry()
@@ -0,0 +1,92 @@
+import os
+import math
+import functools
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence, List
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+
+# Proveedor del proceso worker (uno por proceso, con su propio modelo)
+_worker_provider = None
+
+# Crea el proveedor base por nombre (funcion de modulo: se envia a los workers)
+def _build_base(base: str) -> EmbeddingsProvider:
+    from app.services.embeddings_factory import build_provider
+    return build_provider(base)
+
+# Inicializa cada proceso: limita los threads de torch y carga el modelo una vez
+def _init_worker(factory, threads: int):
+    global _worker_provider
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_provider = factory()
+    _worker_provider._ensure_model()
+
+# Embeddea un fragmento dentro del worker, retorna tambien los textos truncados
+def _encode_shard(texts: List[str]) -> tuple[np.ndarray, int]:
+    before = _worker_provider.truncated
+    emb = _worker_provider.encode_sync(texts)
+    return emb, _worker_provider.truncated - before
+
+# Clase que reparte lotes grandes entre varios procesos, cada uno con el modelo
+# cargado, y reensambla los resultados en el orden original.
+class MultiProcessEmbeddings(EmbeddingsProvider):
+
+	# Constructor de la clase. factory: crea el proveedor base en cada worker
+	# (por defecto build_provider(EMBEDDINGS_MP_BASE)); debe poder enviarse
+	# a otro proceso, p. ej. una funcion de modulo o un functools.partial
+    def __init__(self, factory=None):
+        self.base = os.getenv("EMBEDDINGS_MP_BASE", "sbert")
+        if factory is None and self.base.lower() == "multiprocess":
+            raise ValueError("EMBEDDINGS_MP_BASE=multiprocess: cada worker crearia otro pool de procesos")
+        self._factory = factory or functools.partial(_build_base, self.base)
+        self.threads = int(os.getenv("EMBEDDINGS_THREADS_PER_WORKER", "1"))
+        self.workers = int(os.getenv("EMBEDDINGS_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // self.threads)
+        # Tamano minimo de fragmento, para no pagar el IPC con lotes chicos
+        self.min_shard = int(os.getenv("EMBEDDINGS_MP_MIN_SHARD", "32"))
+        # Nombre/normalizacion del proveedor base, sin cargar el modelo aqui
+        ref = self._factory()
+        self.model_name = ref.model_name
+        self.normalize = ref.normalize
+        self._pool: ProcessPoolExecutor | None = None
+        self.truncated = 0
+
+	# Crea el pool de procesos la primera vez
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self._factory, self.threads),
+            )
+        return self._pool
+
+    async def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        pool = self._ensure_pool()
+        loop = asyncio.get_running_loop()
+        n = max(1, min(self.workers, math.ceil(len(texts) / self.min_shard)))
+        size = math.ceil(len(texts) / n)
+        shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, _encode_shard, shard) for shard in shards
+        ))
+        self.truncated += sum(t for _, t in parts)
+        return np.concatenate([emb for emb, _ in parts], axis=0)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "truncated": self.truncated}
+
+	# Cierra los procesos
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,54 @@
+import os
+from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+from app.services.model_registry import registry
+from app.services.providers.sbert_embeddings import SBertEmbeddings, _str2bool
+
+# Clase que gestiona los embeddings con ONNX Runtime en CPU.
+# Usa el mismo modelo, pooling y normalizacion que SBert; solo cambia el
+# backend de inferencia. Opcionalmente cuantiza los pesos a int8 (dinamico).
+# Requiere: pip install "sentence-transformers[onnx]"
+class OnnxEmbeddings(SBertEmbeddings):
+
+	# Constructor de la clase
+    def __init__(self):
+        super().__init__()
+        self.quantize = _str2bool(os.getenv("EMBEDDINGS_ONNX_QUANTIZE", "true"), True)
+        # avx512_vnni, avx512, avx2 o arm64 segun la CPU de los nodos
+        self.quantization_config = os.getenv("EMBEDDINGS_ONNX_QCONFIG", "avx2")
+        self.export_dir = os.getenv(
+            "EMBEDDINGS_ONNX_DIR",
+            os.path.join(".onnx", self.model_name.replace("/", "__")),
+        )
+
+	# Argumentos para cargar el archivo ONNX cuantizado dentro de export_dir
+    def _model_kwargs(self) -> dict | None:
+        if self.quantize:
+            return {"file_name": f"onnx/model_qint8_{self.quantization_config}.onnx"}
+        return None
+
+	# Exporta el modelo a ONNX (y lo cuantiza) la primera vez; luego solo lo carga
+    def _ensure_model(self) -> SentenceTransformer:
+        if self._model is not None:
+            return self._model
+        if not os.path.exists(os.path.join(self.export_dir, "modules.json")):
+            print(f"Exportando {self.model_name} a ONNX en {self.export_dir}...")
+            exported = SentenceTransformer(
+                self.model_name,
+                backend="onnx",
+                device="cpu",
+                cache_folder=os.getenv("TRANSFORMERS_CACHE", None),
+                local_files_only=self.local_only,
+            )
+            exported.save(self.export_dir)
+        model_kwargs = self._model_kwargs()
+        if model_kwargs and not os.path.exists(os.path.join(self.export_dir, model_kwargs["file_name"])):
+            print(f"Cuantizando a int8 ({self.quantization_config})...")
+            base = SentenceTransformer(self.export_dir, backend="onnx", device="cpu")
+            export_dynamic_quantized_onnx_model(base, self.quantization_config, self.export_dir)
+        self._model = registry.acquire(
+            self.export_dir,
+            device="cpu",
+            backend="onnx",
+            model_kwargs=model_kwargs,
+        )
+        return self._model
@@ -1,8 +1,11 @@
 import os
-from typing import Sequence, List
+from typing import Sequence
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import anyio
 from app.services.embeddings_base import EmbeddingsProvider
+from app.services.model_registry import registry
+from app.services.token_batching import encode_bucketed
 
 # Transforma un String a Booleano equivalente
 def _str2bool(s: str | None, default: bool) -> bool:
@@ -12,37 +15,58 @@ def _str2bool(s: str | None, default: bool) -> bool:
 
 # Clase que gestiona los embeddings de SBert
 class SBertEmbeddings(EmbeddingsProvider):
-    _model: SentenceTransformer | None = None
 
 	# Constructor de la clase
-    def __init__(self):
-        self.model_name = os.getenv("EMBEDDINGS_MODEL", "intfloat/multilingual-e5-base")
+    def __init__(self, model_name: str | None = None, trust_remote_code: bool | None = None):
+        self.model_name = model_name or os.getenv("EMBEDDINGS_MODEL", "intfloat/multilingual-e5-base")
         self.device = os.getenv("EMBEDDINGS_DEVICE", "cpu")
         self.normalize = _str2bool(os.getenv("EMBEDDINGS_NORMALIZE", "true"), True)
         self.local_only = _str2bool(os.getenv("HF_LOCAL_ONLY", "false"), False)
+        self.trust_remote_code = trust_remote_code if trust_remote_code is not None else \
+            _str2bool(os.getenv("EMBEDDINGS_TRUST_REMOTE_CODE", "false"), False)
+        # Lotes por presupuesto de tokens (n_textos * largo del mas largo)
+        self.token_budget = int(os.getenv("EMBEDDINGS_TOKEN_BUDGET", "8192"))
+        self.truncated = 0
+        self._model: SentenceTransformer | None = None
 		
-	# Establece el modelo a utilizar
+	# Establece el modelo a utilizar (compartido via el registro de modelos)
     def _ensure_model(self) -> SentenceTransformer:
-        if SBertEmbeddings._model is None:
-            SBertEmbeddings._model = SentenceTransformer(
+        if self._model is None:
+            self._model = registry.acquire(
                 self.model_name,
                 device=self.device,
-                cache_folder=os.getenv("TRANSFORMERS_CACHE", None),
+                trust_remote_code=self.trust_remote_code,
                 local_files_only=self.local_only,
             )
-        return SBertEmbeddings._model
+        return self._model
+
+	# Embeddea los textos de forma sincrona, retorna una matriz (n, dim)
+	# Agrupa por largo en tokens y avisa cuantos textos se truncaron
+    def encode_sync(self, texts: Sequence[str]) -> np.ndarray:
+        model = self._ensure_model()
+        emb, truncated = encode_bucketed(
+            model,
+            texts,
+            normalize=self.normalize,
+            token_budget=self.token_budget,
+            max_batch=int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32")),
+        )
+        if truncated:
+            self.truncated += truncated
+            print(f"{truncated} de {len(texts)} textos truncados a {model.max_seq_length} tokens")
+        return emb
 	
 	# Funcion para embeddir textos hacia SBert
 	# Es asincrona y utiliza un thread pool
-    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
-        model = self._ensure_model()
-        def _encode() -> List[List[float]]:
-            emb = model.encode(
-                list(texts),
-                normalize_embeddings=self.normalize,
-                convert_to_numpy=True,
-                batch_size=int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32")),
-                show_progress_bar=False,
-            )
-            return emb.tolist()
-        return await anyio.to_thread.run_sync(_encode)
+    async def embed_array(self, texts: Sequence[str]) -> np.ndarray:
+        self._ensure_model()
+        return await anyio.to_thread.run_sync(self.encode_sync, texts)
+
+    def stats(self) -> dict:
+        return {"truncated": self.truncated}
+
+	# Devuelve el modelo al registro
+    def close(self):
+        if self._model is not None:
+            registry.release(self._model)
+            self._model = None
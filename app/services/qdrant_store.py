@@ -1,87 +1,518 @@
 import os
+import json
+import uuid
+import hashlib
+import time
+import functools
+import threading
+from datetime import date
 from typing import Iterable, List, Dict, Any
+import anyio
+import numpy as np
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
     VectorParams, Distance, PointStruct, Filter,
-    FieldCondition, MatchValue, MatchAny
+    FieldCondition, MatchValue, MatchAny, QueryRequest,
+    PayloadSchemaType, Range, DatetimeRange, HnswConfigDiff, SearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, QuantizationSearchParams,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
 )
+from app.services.dense_index import DenseIndex, filter_mask
+from app.services.match_cache import match_cache
+from app.services.affinity_store import affinity_store
+from app.services.fund_attributes import FundAttributes
 
 # Variables de entorno para comunicarse con Qdrant
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+# memory: en memoria, se reconstruye en cada arranque (por defecto)
+# local: archivos en QDRANT_PATH (un solo proceso puede abrirlos)
+# server: servicio Qdrant en QDRANT_URL (ver qdrant.sh), compartido por los workers
+QDRANT_MODE = os.getenv("QDRANT_MODE", "memory").lower()
+QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_local")
+# Puntos por pagina al recorrer colecciones completas
+QDRANT_SCROLL_PAGE = int(os.getenv("QDRANT_SCROLL_PAGE", "256"))
 
 # Numero de topics almacenados en el modelo
-NUMBER_OF_TOPICS = os.getenv("NUMBER_OF_TOPICS", 90)
+NUMBER_OF_TOPICS = int(os.getenv("NUMBER_OF_TOPICS", 90))
 
-# Se conecta al servicio de Qdrant ya levantado
-# client = QdrantClient(url=QDRANT_URL)
-client = QdrantClient(":memory:")
+# Nombres de los vectores en colecciones con vectores nombrados (ideas, funds, user_projects)
+SEMANTIC = "semantic"
+TOPIC = "topic"
+
+# Coleccion con la version de los datos cargados en cada coleccion
+VERSIONS_COLLECTION = "_versions"
+
+# Se conecta a Qdrant segun QDRANT_MODE
+def _build_client() -> QdrantClient:
+    if QDRANT_MODE == "server":
+        return QdrantClient(url=QDRANT_URL)
+    if QDRANT_MODE == "local":
+        return QdrantClient(path=QDRANT_PATH)
+    if QDRANT_MODE != "memory":
+        raise ValueError(f"QDRANT_MODE desconocido: {QDRANT_MODE}")
+    return QdrantClient(":memory:")
+
+client = _build_client()
+
+# Indices de payload por coleccion: los campos usados en build_filter.
+# Sin indice, una busqueda filtrada recorre los payloads de toda la coleccion
+PAYLOAD_SCHEMAS: Dict[str, Dict[str, PayloadSchemaType]] = {
+    "funds": {
+        "Estado": PayloadSchemaType.KEYWORD,
+        "TipoDePerfil": PayloadSchemaType.KEYWORD,
+        "MontoMinimo": PayloadSchemaType.INTEGER,
+        "MontoMaximo": PayloadSchemaType.INTEGER,
+        "FechaDeApertura": PayloadSchemaType.DATETIME,
+        "FechaDeCierre": PayloadSchemaType.DATETIME,
+    },
+}
+
+# Crea los indices de payload declarados para la coleccion.
+# Solo en modo server: el Qdrant local no usa indices de payload
+# physical: coleccion fisica (por defecto, la que esta detras del alias)
+def ensure_payload_indexes(name: str, physical: str | None = None):
+    if QDRANT_MODE != "server":
+        return
+    physical = physical or physical_collection(name) or name
+    existing = client.get_collection(physical).payload_schema
+    for field, schema in PAYLOAD_SCHEMAS.get(name, {}).items():
+        if field not in existing:
+            client.create_payload_index(collection_name=physical, field_name=field, field_schema=schema, wait=True)
+
+# Perfiles de indice por coleccion y vector ("" = vector sin nombre):
+#   m, ef_construct: grafo HNSW; ef: candidatos explorados al buscar
+#   quantize: cuantizacion escalar int8 en RAM, con rescoring sobre los
+#             vectores originales (oversampling) al buscar
+#   on_disk: vectores originales en disco (solo quedan en RAM los int8)
+# Los vectores de topicos (90-d) son chicos: no se cuantizan.
+# QDRANT_INDEX_PROFILES (JSON con la misma forma) reemplaza perfiles por coleccion
+_SEMANTIC_PROFILE = {"m": 16, "ef_construct": 100, "ef": 64, "quantize": True, "oversampling": 2.0, "on_disk": True}
+_TOPIC_PROFILE = {"m": 16, "ef_construct": 100, "ef": 64, "quantize": False, "on_disk": False}
+INDEX_PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "funds": {SEMANTIC: _SEMANTIC_PROFILE, TOPIC: _TOPIC_PROFILE},
+    "similar_projects": {"": _SEMANTIC_PROFILE},
+    "user_projects": {SEMANTIC: _SEMANTIC_PROFILE, TOPIC: _TOPIC_PROFILE},
+}
+INDEX_PROFILES.update(json.loads(os.getenv("QDRANT_INDEX_PROFILES", "{}")))
+
+# Perfil de indice de un vector de la coleccion (None: valores por defecto)
+def index_profile(collection: str, vec_name: str = "") -> Dict[str, Any] | None:
+    return INDEX_PROFILES.get(collection, {}).get(vec_name)
+
+def _vector_params(collection: str, vec_name: str, size: int) -> VectorParams:
+    profile = index_profile(collection, vec_name)
+    if not profile:
+        return VectorParams(size=size, distance=Distance.COSINE)
+    quantization = None
+    if profile.get("quantize"):
+        quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True,
+        ))
+    return VectorParams(
+        size=size,
+        distance=Distance.COSINE,
+        hnsw_config=HnswConfigDiff(m=profile.get("m"), ef_construct=profile.get("ef_construct")),
+        quantization_config=quantization,
+        on_disk=profile.get("on_disk"),
+    )
+
+# Parametros de busqueda segun el perfil (ef y rescoring de la cuantizacion)
+def search_params(collection: str, vec_name: str = "") -> SearchParams | None:
+    profile = index_profile(collection, vec_name)
+    if not profile:
+        return None
+    quantization = None
+    if profile.get("quantize"):
+        quantization = QuantizationSearchParams(rescore=True, oversampling=profile.get("oversampling", 2.0))
+    return SearchParams(hnsw_ef=profile.get("ef"), quantization=quantization)
 
 # Carga los nuevos elementos en la coleccion
-def ensure_collection(name: str, vector_size: int):
-    existing = [c.name for c in client.get_collections().collections]
-    if name not in existing:
-        client.create_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
-        )
+# vector_size puede ser un entero o {nombre: dimension} para vectores nombrados
+def ensure_collection(name: str, vector_size: int | Dict[str, int]):
+    if physical_collection(name) is None:
+        _create_collection(name, name, vector_size)
+    ensure_payload_indexes(name)
+
+# Crea la coleccion fisica con los perfiles de indice del nombre logico
+def _create_collection(name: str, physical: str, vector_size: int | Dict[str, int]):
+    if isinstance(vector_size, dict):
+        vectors_config = {
+            vec_name: _vector_params(name, vec_name, size)
+            for vec_name, size in vector_size.items()
+        }
+    else:
+        vectors_config = _vector_params(name, "", vector_size)
+    client.create_collection(collection_name=physical, vectors_config=vectors_config)
+
+# Coleccion fisica detras del nombre logico: el destino del alias, el mismo
+# nombre si es una coleccion real (cargada antes de usar alias) o None
+def physical_collection(name: str) -> str | None:
+    aliases = {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+    if name in aliases:
+        return aliases[name]
+    return name if name in [c.name for c in client.get_collections().collections] else None
 	
+# Version de una carga: hash de los archivos fuente y de las partes dadas
+# (modelos, dimensiones). Si cambia cualquiera, la coleccion se reconstruye
+def ingest_version(files: Iterable[str], **parts) -> str:
+    stamp: Dict[str, Any] = dict(parts)
+    for path in files:
+        try:
+            with open(path, "rb") as f:
+                stamp[path] = hashlib.sha1(f.read()).hexdigest()
+        except FileNotFoundError:
+            stamp[path] = None
+    return hashlib.sha1(json.dumps(stamp, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _version_id(name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, name))
+
+# Version guardada de la coleccion (None si nunca se cargo)
+def collection_version(name: str) -> str | None:
+    if not client.collection_exists(VERSIONS_COLLECTION):
+        return None
+    recs = client.retrieve(VERSIONS_COLLECTION, ids=[_version_id(name)], with_payload=True)
+    return recs[0].payload.get("version") if recs else None
+
+# Marca la coleccion como cargada con la version dada. vectors: version de
+# los modelos y dimensiones, para saber si los puntos se pueden copiar tal cual
+def set_collection_version(name: str, version: str, vectors: str | None = None):
+    ensure_collection(VERSIONS_COLLECTION, 1)
+    client.upsert(
+        collection_name=VERSIONS_COLLECTION,
+        points=[PointStruct(id=_version_id(name), vector=[1.0],
+                            payload={"collection": name, "version": version, "vectors": vectors})],
+    )
+
+# Version de los vectores guardada junto a la de la coleccion
+def collection_vectors_version(name: str) -> str | None:
+    if not client.collection_exists(VERSIONS_COLLECTION):
+        return None
+    recs = client.retrieve(VERSIONS_COLLECTION, ids=[_version_id(name)], with_payload=True)
+    return recs[0].payload.get("vectors") if recs else None
+
+# True si la coleccion ya tiene datos de la version dada (se omite la carga)
+def collection_is_current(name: str, version: str) -> bool:
+    if physical_collection(name) is None or collection_version(name) != version:
+        return False
+    if client.count(name).count == 0:
+        return False
+    ensure_payload_indexes(name)
+    return True
+
+# Carga con varios workers (QDRANT_MODE=server, todos corren el lifespan):
+# cada nombre logico ("funds") es un alias hacia la coleccion fisica vigente.
+# Un solo worker carga a la vez (candado _lock_<nombre>: crear una coleccion
+# que ya existe falla, tambien en el servidor); el resto espera a que la
+# version quede al dia. La carga va a una coleccion nueva y al terminar se
+# mueve el alias, asi la coleccion vigente nunca se borra mientras se usa.
+# Un candado mas viejo que QDRANT_INGEST_LOCK_TTL (worker caido) se libera
+INGEST_LOCK_TTL = float(os.getenv("QDRANT_INGEST_LOCK_TTL", "1800"))
+INGEST_LOCK_POLL = float(os.getenv("QDRANT_INGEST_LOCK_POLL", "2"))
+
+def _lock_name(name: str) -> str:
+    return f"_lock_{name}"
+
+# Toma el candado de carga; False si otro worker lo tiene
+def acquire_ingest_lock(name: str) -> bool:
+    lock = _lock_name(name)
+    try:
+        client.create_collection(collection_name=lock, vectors_config=VectorParams(size=1, distance=Distance.COSINE))
+    except Exception:
+        try:
+            recs, _ = client.scroll(collection_name=lock, limit=1, with_payload=True)
+        except Exception:
+            return False
+        since = recs[0].payload.get("since") if recs else None
+        if since is not None and time.time() - since > INGEST_LOCK_TTL:
+            print(f"Candado de carga de {name} vencido, se libera")
+            release_ingest_lock(name)
+        return False
+    client.upsert(collection_name=lock, points=[PointStruct(id=0, vector=[1.0], payload={"since": time.time()})])
+    return True
+
+def release_ingest_lock(name: str):
+    client.delete_collection(_lock_name(name))
+
+# Crea una coleccion fisica nueva y vacia donde cargar una version
+def new_build_collection(name: str, vector_size: int | Dict[str, int]) -> str:
+    physical = f"{name}__{time.time_ns()}"
+    _create_collection(name, physical, vector_size)
+    ensure_payload_indexes(name, physical)
+    return physical
+
+# Puntos de source que no estan en target (p. ej. escritos en runtime)
+def missing_points(source: str, target: str) -> list:
+    loaded, offset = set(), None
+    while True:
+        page, offset = client.scroll(
+            collection_name=target, offset=offset, limit=QDRANT_SCROLL_PAGE,
+            with_payload=False, with_vectors=False,
+        )
+        loaded.update(r.id for r in page)
+        if offset is None:
+            break
+    return [r for r in _scroll_all(source) if r.id not in loaded]
+
+# Mueve el alias a la coleccion fisica nueva (una operacion atomica) y guarda
+# la version. Una coleccion real con el nombre logico (de antes de usar
+# alias) se borra justo antes de crear el alias
+def publish_collection(name: str, physical: str, version: str, vectors: str | None = None):
+    old = physical_collection(name)
+    operations = []
+    if old == name:
+        client.delete_collection(name)
+    elif old is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=name)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=physical, alias_name=name)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    set_collection_version(name, version, vectors)
+    invalidate_dense_index(name)
+    match_cache.touch(name)
+    affinity_store.discard(name)
+
+# Borra colecciones fisicas de la coleccion que no son la vigente (cargas
+# anteriores o interrumpidas)
+def drop_stale_builds(name: str):
+    current = physical_collection(name)
+    for c in client.get_collections().collections:
+        if c.name.startswith(f"{name}__") and c.name != current:
+            client.delete_collection(c.name)
+
 # Upsertea los puntos hacia la colleccion
 def upsert_points(collection: str, points: List[PointStruct]):
     client.upsert(collection_name=collection, points=points)
+    invalidate_dense_index(collection)
+    match_cache.touch(collection, [p.id for p in points])
+    vectors = [p.vector if isinstance(p.vector, dict) else {} for p in points]
+    _materialize(collection, [p.id for p in points], {
+        name: np.asarray([v[name] for v in vectors], dtype=np.float32)
+        for name in (SEMANTIC, TOPIC) if all(name in v for v in vectors)
+    }, [p.payload or {} for p in points])
+
+# Upsertea una matriz float32 (n, dim) directamente, sin armar listas de floats
+# Para vectores nombrados se entrega {nombre: matriz}
+def upsert_vectors(
+    collection: str,
+    ids: List[int],
+    vectors: np.ndarray | Dict[str, np.ndarray],
+    payloads: List[Dict[str, Any]],
+):
+    if isinstance(vectors, dict):
+        vectors = {k: np.asarray(v, dtype=np.float32) for k, v in vectors.items()}
+    else:
+        vectors = np.asarray(vectors, dtype=np.float32)
+    client.upload_collection(
+        collection_name=collection,
+        vectors=vectors,
+        payload=payloads,
+        ids=ids,
+        wait=True,
+    )
+    invalidate_dense_index(collection)
+    match_cache.touch(collection, ids)
+    _materialize(collection, ids, vectors if isinstance(vectors, dict) else {}, payloads)
 
-# Busca la colleccion de instrumentos
-def search_funds(
-    query_vector: List[float],
+# Mantiene al dia la matriz de afinidad materializada tras escribir ideas o
+# fondos. Sin ambos vectores (semantico y de topicos) se descartan los puntos
+def _materialize(collection: str, ids: List, vectors: Dict[str, np.ndarray], payloads: List[Dict[str, Any]]):
+    if collection not in ("ideas", "funds") or not affinity_store.ready or not len(ids):
+        return
+    if SEMANTIC not in vectors or TOPIC not in vectors:
+        affinity_store.discard(collection, ids)
+    elif collection == "ideas":
+        affinity_store.put_ideas(list(ids), vectors[SEMANTIC], vectors[TOPIC])
+    else:
+        affinity_store.put_funds(list(ids), vectors[SEMANTIC], vectors[TOPIC], payloads)
+
+# Recorre toda la coleccion (con vectores y payloads)
+def _scroll_all(collection: str) -> list:
+    records, offset = [], None
+    while True:
+        page, offset = client.scroll(
+            collection_name=collection, offset=offset, limit=QDRANT_SCROLL_PAGE,
+            with_payload=True, with_vectors=True,
+        )
+        records.extend(page)
+        if offset is None:
+            return records
+
+# Arma la matriz de afinidad con todos los fondos e ideas (al iniciar, una
+# vez cargadas las colecciones); luego se mantiene con cada escritura
+def load_affinity_store():
+    if not affinity_store.enabled:
+        return
+    loaded = {}
+    for collection in ("funds", "ideas"):
+        records = [r for r in _scroll_all(collection)
+                   if named_vector(r, SEMANTIC) is not None and named_vector(r, TOPIC) is not None]
+        loaded[collection] = (
+            [r.id for r in records],
+            np.asarray([named_vector(r, SEMANTIC) for r in records], dtype=np.float32),
+            np.asarray([named_vector(r, TOPIC) for r in records], dtype=np.float32),
+            [r.payload or {} for r in records],
+        )
+    affinity_store.load(*loaded["funds"], *loaded["ideas"][:3])
+
+# Busqueda exacta con NumPy para colecciones de hasta NUMPY_SEARCH_MAX_POINTS
+# puntos (0 la desactiva): un producto de matrices le gana al grafo HNSW con
+# catalogos de cientos o miles de fondos. El indice se arma al buscar y se
+# descarta al escribir en la coleccion; en modo server, donde otros procesos
+# tambien escriben, ademas expira tras NUMPY_INDEX_TTL segundos
+NUMPY_SEARCH_MAX_POINTS = int(os.getenv("NUMPY_SEARCH_MAX_POINTS", "5000"))
+NUMPY_INDEX_TTL = float(os.getenv("NUMPY_INDEX_TTL", "30" if QDRANT_MODE == "server" else "0"))
+# coleccion -> (indice o None si es muy grande, momento de armado)
+_dense: Dict[str, tuple] = {}
+# coleccion -> escrituras; un indice armado durante una escritura no se guarda
+_dense_writes: Dict[str, int] = {}
+_dense_lock = threading.Lock()
+
+# Descarta el indice NumPy de la coleccion (se rearma en la proxima busqueda)
+def invalidate_dense_index(collection: str):
+    with _dense_lock:
+        _dense_writes[collection] = _dense_writes.get(collection, 0) + 1
+        _dense.pop(collection, None)
+
+# Indice NumPy de la coleccion, o None si supera el umbral de tamano
+def dense_index(collection: str) -> DenseIndex | None:
+    if NUMPY_SEARCH_MAX_POINTS <= 0:
+        return None
+    with _dense_lock:
+        entry = _dense.get(collection)
+        if entry is not None and (NUMPY_INDEX_TTL <= 0 or time.monotonic() - entry[1] < NUMPY_INDEX_TTL):
+            return entry[0]
+        writes = _dense_writes.get(collection, 0)
+    # Se arma fuera del lock, asi las escrituras no esperan al scroll
+    index = None
+    if client.count(collection_name=collection, exact=True).count <= NUMPY_SEARCH_MAX_POINTS:
+        index = DenseIndex.from_records(_scroll_all(collection))
+    with _dense_lock:
+        if _dense_writes.get(collection, 0) == writes:
+            _dense[collection] = (index, time.monotonic())
+    return index
+
+# Mascara del filtro sobre el indice NumPy; None si hay que buscar en Qdrant
+def _dense_mask(index: DenseIndex | None, must_filter: Filter | None):
+    if index is None:
+        return None
+    if must_filter is None:
+        return np.ones(len(index), dtype=bool)
+    return filter_mask(index.payloads, must_filter, index.attributes)
+
+# Vectores guardados (normalizados) de los puntos dados, alineados con ids:
+# {nombre: matriz (len(ids), dim)}. Usa el indice NumPy si la coleccion es
+# chica; si no, un solo retrieve. Puntos inexistentes quedan en cero
+def point_vectors(collection: str, ids: List, names: List[str]) -> Dict[str, np.ndarray]:
+    index = dense_index(collection)
+    if index is not None and all(i in index.position for i in ids):
+        rows = [index.position[i] for i in ids]
+        return {name: index.matrices[name][rows] for name in names}
+    records = client.retrieve(collection_name=collection, ids=ids, with_vectors=names, with_payload=False)
+    by_id = {r.id: r for r in records}
+    out = {}
+    for name in names:
+        dim = next((len(named_vector(r, name)) for r in records if named_vector(r, name) is not None), 0)
+        m = np.zeros((len(ids), dim), dtype=np.float32)
+        for n, i in enumerate(ids):
+            vec = named_vector(by_id[i], name) if i in by_id else None
+            if vec is not None:
+                m[n] = vec
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        out[name] = m / np.where(norms == 0, 1, norms)
+    return out
+
+# Atributos categoricos (bitsets) de los fondos dados, alineados con ids.
+# Usa los codificados al cargar (matriz de afinidad o indice NumPy ya
+# armado); si no estan, codifica los payloads recibidos ({id: payload})
+def fund_attributes(ids: List, payloads: Dict[Any, dict]) -> FundAttributes:
+    attrs = affinity_store.fund_attributes(ids)
+    if attrs is not None:
+        return attrs
+    with _dense_lock:
+        entry = _dense.get("funds")
+    index = entry[0] if entry is not None else None
+    if index is not None and all(i in index.position for i in ids):
+        return index.attributes.take([index.position[i] for i in ids])
+    return FundAttributes.from_payloads([payloads[i] for i in ids])
+
+# Busca fondos por similitud semantica y de topicos para varias consultas a la
+# vez (matrices (n, dim) y (n, topicos)). Retorna [(hits_semanticos, hits_de_topicos)]
+def search_funds_hybrid_batch(
+    semantic_vectors: np.ndarray,
+    topic_vectors: np.ndarray,
     top_k: int = 10,
     must_filter: Filter | None = None
 ):
-    return client.search(
-        collection_name="funds",
-        query_vector=query_vector,
-        limit=top_k,
-        query_filter=must_filter
-    )
+    semantic_vectors = np.atleast_2d(np.asarray(semantic_vectors, dtype=np.float32))
+    topic_vectors = np.atleast_2d(np.asarray(topic_vectors, dtype=np.float32))
+    index = dense_index("funds")
+    mask = _dense_mask(index, must_filter)
+    if mask is not None:
+        return list(zip(
+            index.search(SEMANTIC, semantic_vectors, top_k, mask),
+            index.search(TOPIC, topic_vectors, top_k, mask),
+        ))
+    # Colecciones grandes: ambas consultas de cada fila en un solo viaje a Qdrant
+    requests = []
+    for sem, top in zip(semantic_vectors, topic_vectors):
+        requests.append(QueryRequest(query=sem, using=SEMANTIC, limit=top_k, filter=must_filter,
+                                     params=search_params("funds", SEMANTIC), with_payload=True))
+        requests.append(QueryRequest(query=top, using=TOPIC, limit=top_k, filter=must_filter,
+                                     params=search_params("funds", TOPIC), with_payload=True))
+    responses = client.query_batch_points(collection_name="funds", requests=requests)
+    return [(responses[i].points, responses[i + 1].points) for i in range(0, len(responses), 2)]
 
-# Busca los topicos en la coleccion
-def search_topics(
-    query_vector: List[float],
+# Busca fondos por similitud semantica y de topicos en un solo viaje:
+# ambas consultas van juntas a la coleccion hibrida "funds" (vectores
+# nombrados). Retorna (hits_semanticos, hits_de_topicos)
+def search_funds_hybrid(
+    semantic_vector: List[float] | np.ndarray,
+    topic_vector: List[float] | np.ndarray,
     top_k: int = 10,
     must_filter: Filter | None = None
 ):
-    return client.search(
-        collection_name="funds_topics",
-        query_vector=query_vector,
-        limit=top_k,
-        query_filter=must_filter
-    )
+    return search_funds_hybrid_batch(semantic_vector, topic_vector, top_k, must_filter)[0]
+
+# Busca los proyectos mas similares para varias consultas (n, dim) a la vez
+def search_projects_batch(
+    query_vectors: np.ndarray,
+    top_k: int = 10,
+    must_filter: Filter | None = None
+):
+    query_vectors = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+    index = dense_index("similar_projects")
+    mask = _dense_mask(index, must_filter)
+    if mask is not None:
+        return index.search("", query_vectors, top_k, mask)
+    responses = client.query_batch_points(collection_name="similar_projects", requests=[
+        QueryRequest(query=q, limit=top_k, filter=must_filter,
+                     params=search_params("similar_projects"), with_payload=True)
+        for q in query_vectors
+    ])
+    return [r.points for r in responses]
 
 # Busca los proyectos en la coleccion
 def search_projects(
-    query_vector: List[float],
+    query_vector: List[float] | np.ndarray,
     top_k: int = 10,
     must_filter: Filter | None = None
 ):
-    return client.search(
-        collection_name="similar_projects",
-        query_vector=query_vector,
-        limit=top_k,
-        query_filter=must_filter
-    )
+    return search_projects_batch(query_vector, top_k, must_filter)[0]
 
-# Busca todos los puntos en la coleccion
-def search_all_points(collection: str):
-    return client.scroll(
-        collection_name=collection,
-        limit=1000,
-        with_payload=True,
-        with_vectors=True
-    )
+# Extrae un vector nombrado de un punto recuperado (None si no lo tiene)
+def named_vector(record, name: str):
+    vec = record.vector
+    if isinstance(vec, dict):
+        return vec.get(name)
+    return vec if name == SEMANTIC else None
 
 # Helpers de filtros (region/estado/tipo beneficiario, etc.)
 def build_filter(
     estado: str | None = None,
     regiones: list[str] | None = None,
     tipos_perfil: list[str] | None = None,
+    monto: int | None = None,
+    fecha: date | str | None = None,
 ) -> Filter | None:
     conds = []
     if estado:
@@ -89,7 +520,142 @@ def build_filter(
     if regiones:
         conds.append(FieldCondition(key="Regiones", match=MatchAny(any=regiones)))
     if tipos_perfil:
-        conds.append(FieldCondition(key="TiposDePerfil", match=MatchAny(any=tipos_perfil)))
+        conds.append(FieldCondition(key="TipoDePerfil", match=MatchAny(any=tipos_perfil)))
+    # Monto solicitado dentro del rango del fondo
+    if monto is not None:
+        conds.append(FieldCondition(key="MontoMinimo", range=Range(lte=monto)))
+        conds.append(FieldCondition(key="MontoMaximo", range=Range(gte=monto)))
+    # Fondo abierto en la fecha dada (YYYY-MM-DD o RFC 3339)
+    if fecha:
+        conds.append(FieldCondition(key="FechaDeApertura", range=DatetimeRange(lte=fecha)))
+        conds.append(FieldCondition(key="FechaDeCierre", range=DatetimeRange(gte=fecha)))
     if conds:
         return Filter(must=conds)
     return None
+
+# API asincrona: las mismas operaciones corren en un pool de threads acotado
+# (QDRANT_MAX_CONCURRENCY) para no bloquear el event loop de uvicorn.
+# En modo memory/local el cliente no es seguro entre threads, por lo que se
+# serializa (1); en modo server las consultas se solapan
+QDRANT_MAX_CONCURRENCY = int(os.getenv(
+    "QDRANT_MAX_CONCURRENCY", "8" if QDRANT_MODE == "server" else "1"
+))
+_limiter: anyio.CapacityLimiter | None = None
+
+# Ejecuta fn en un thread respetando el limite de concurrencia
+async def _run(fn, *args, **kwargs):
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(QDRANT_MAX_CONCURRENCY)
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_limiter)
+
+async def aupsert_vectors(collection: str, ids: List[int], vectors, payloads: List[Dict[str, Any]]):
+    return await _run(upsert_vectors, collection, ids, vectors, payloads)
+
+async def aupsert_points(collection: str, points: List[PointStruct]):
+    return await _run(upsert_points, collection, points)
+
+async def asearch_funds_hybrid(semantic_vector, topic_vector, top_k: int = 10, must_filter: Filter | None = None):
+    return await _run(search_funds_hybrid, semantic_vector, topic_vector, top_k, must_filter)
+
+async def asearch_funds_hybrid_batch(semantic_vectors, topic_vectors, top_k: int = 10, must_filter: Filter | None = None):
+    return await _run(search_funds_hybrid_batch, semantic_vectors, topic_vectors, top_k, must_filter)
+
+async def aload_affinity_store():
+    return await _run(load_affinity_store)
+
+# Copia a target los puntos de source que no trae la carga (escritos en
+# runtime): con sus vectores si los modelos no cambiaron, o re-vectorizados
+# con embed(payloads) si cambiaron
+async def _carry_points(source: str, target: str, same_vectors: bool, embed):
+    records = await _run(missing_points, source, target)
+    if records:
+        print(f"Conservando {len(records)} puntos de {source} en {target}")
+    for i in range(0, len(records), QDRANT_SCROLL_PAGE):
+        page = records[i:i + QDRANT_SCROLL_PAGE]
+        if same_vectors:
+            await _run(client.upsert, collection_name=target, points=[
+                PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in page
+            ])
+        else:
+            payloads = [r.payload or {} for r in page]
+            await aupsert_vectors(target, [r.id for r in page], await embed(payloads), payloads)
+
+# Carga la coleccion si su version cambio y retorna True si la cargo.
+# load(coleccion) escribe los datos fuente en la coleccion fisica dada;
+# embed(payloads) vectoriza los puntos de runtime si cambiaron los modelos
+# (vectors es la version de modelos y dimensiones).
+# Precedencia entre la fuente y lo escrito en runtime:
+# - IDs que trae la fuente: gana la fuente. Una escritura de runtime a esos
+#   IDs en la coleccion vigente (antes o durante la carga) no se copia; la
+#   fuente (backend/core) es la que registra esos cambios.
+# - IDs que solo existen en la vigente: se copian antes de publicar, y
+#   despues se copian los que llegaron a la vigente mientras tanto. Una
+#   re-escritura de un ID ya copiado, hecha entre la copia y la publicacion,
+#   se pierde; despues de publicar las escrituras van a la coleccion nueva.
+async def aload_collection(name: str, vector_size, version: str, vectors: str, load, embed) -> bool:
+    while True:
+        if await _run(collection_is_current, name, version):
+            return False
+        if await _run(acquire_ingest_lock, name):
+            break
+        await anyio.sleep(INGEST_LOCK_POLL)
+    try:
+        if await _run(collection_is_current, name, version):
+            return False
+        old = await _run(physical_collection, name)
+        same_vectors = await _run(collection_vectors_version, name) == vectors
+        physical = await _run(new_build_collection, name, vector_size)
+        try:
+            await load(physical)
+            if old is not None:
+                await _carry_points(old, physical, same_vectors, embed)
+        except BaseException:
+            # La coleccion vigente queda intacta
+            await _run(client.delete_collection, physical)
+            raise
+        await _run(publish_collection, name, physical, version, vectors)
+        if old is not None and old != name:
+            # IDs nuevos escritos en la anterior mientras se cargaba la nueva
+            await _carry_points(old, physical, same_vectors, embed)
+        await _run(drop_stale_builds, name)
+        return True
+    finally:
+        await _run(release_ingest_lock, name)
+
+async def apoint_vectors(collection: str, ids: List, names: List[str]) -> Dict[str, np.ndarray]:
+    return await _run(point_vectors, collection, ids, names)
+
+async def asearch_projects(query_vector, top_k: int = 10, must_filter: Filter | None = None):
+    return await _run(search_projects, query_vector, top_k, must_filter)
+
+# Recorre la coleccion por paginas, sin vectores, desde el cursor dado.
+# Entrega (payloads, siguiente_cursor); se detiene al agotar la coleccion
+# o al completar limit puntos. El cursor final sirve para la pagina siguiente
+async def aiter_payloads(
+    collection: str,
+    cursor: int | str | None = None,
+    limit: int | None = None,
+    page_size: int = QDRANT_SCROLL_PAGE,
+):
+    remaining = limit
+    while True:
+        n = page_size if remaining is None else min(page_size, remaining)
+        points, cursor = await _run(
+            client.scroll, collection_name=collection, offset=cursor, limit=n,
+            with_payload=True, with_vectors=False,
+        )
+        if remaining is not None:
+            remaining -= len(points)
+        yield [p.payload for p in points], cursor
+        if cursor is None or (remaining is not None and remaining <= 0):
+            return
+
+# Recupera puntos por ID con vectores y payload
+async def aretrieve(collection: str, ids: List[int]):
+    return await _run(client.retrieve, collection_name=collection, ids=ids,
+                      with_vectors=True, with_payload=True)
+
+# Cantidad exacta de puntos en la coleccion
+async def acount(collection: str) -> int:
+    return (await _run(client.count, collection_name=collection, exact=True)).count
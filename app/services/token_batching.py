@@ -0,0 +1,57 @@
+from typing import Sequence, List
+import numpy as np
+
+# Agrupa indices por largo en tokens: ordena de mayor a menor y arma lotes
+# cuyo costo (n_textos * largo_maximo, lo que se paga con padding) no supere
+# token_budget. Retorna los lotes como listas de indices originales.
+def plan_batches(lengths: Sequence[int], token_budget: int, max_batch: int) -> List[List[int]]:
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    longest = 0
+    for i in order:
+        longest_if_added = max(longest, lengths[i])
+        if current and (len(current) >= max_batch or (len(current) + 1) * longest_if_added > token_budget):
+            batches.append(current)
+            current, longest_if_added = [], lengths[i]
+        current.append(i)
+        longest = longest_if_added
+    if current:
+        batches.append(current)
+    return batches
+
+# Embeddea con SentenceTransformer agrupando por largo en tokens. El largo
+# solo se usa para planificar los lotes y contar los textos que exceden
+# max_seq_length; cada lote pasa por model.encode, asi se respetan los
+# prompts, el tokenize propio de cada modulo y el codigo remoto del modelo.
+# Retorna la matriz en el orden original y el numero de textos truncados.
+def encode_bucketed(
+    model,
+    texts: Sequence[str],
+    normalize: bool,
+    token_budget: int,
+    max_batch: int,
+) -> tuple[np.ndarray, int]:
+    texts = list(texts)
+    dim = model.get_sentence_embedding_dimension()
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32), 0
+    max_len = model.max_seq_length
+    lengths = [len(ids) for ids in model.tokenizer(
+        texts,
+        add_special_tokens=True,
+        truncation=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )["input_ids"]]
+    truncated = sum(1 for n in lengths if n > max_len)
+    out = np.empty((len(texts), dim), dtype=np.float32)
+    for batch in plan_batches([min(n, max_len) for n in lengths], token_budget, max_batch):
+        out[batch] = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            normalize_embeddings=normalize,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+    return out, truncated
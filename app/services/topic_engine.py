@@ -0,0 +1,108 @@
+import io
+import os
+import json
+import pickle
+import struct
+import zipfile
+from collections import OrderedDict
+import numpy as np
+
+# Tipos de storage de torch -> dtype de NumPy
+_STORAGE_DTYPES = {
+    "FloatStorage": np.float32,
+    "DoubleStorage": np.float64,
+    "HalfStorage": np.float16,
+    "IntStorage": np.int32,
+    "LongStorage": np.int64,
+}
+
+# Offset de los datos de una entrada (sin comprimir) dentro del zip
+def _entry_offset(path: str, info: zipfile.ZipInfo) -> int:
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_len + extra_len
+
+# Lee un archivo guardado con torch.save (formato zip, como los .bin de
+# BERTopic) sin importar torch: cada tensor queda como un np.memmap de solo
+# lectura sobre el mismo archivo. Retorna {nombre: arreglo}
+def load_torch_tensors(path: str) -> dict:
+    zf = zipfile.ZipFile(path)
+    infos = {i.filename: i for i in zf.infolist()}
+    pkl_name = next(n for n in infos if n.endswith("/data.pkl"))
+    prefix = pkl_name[: -len("data.pkl")]
+    with zf.open(pkl_name) as f:
+        pkl = f.read()
+
+    def rebuild_tensor(storage, storage_offset, size, stride, *args):
+        dtype, key = storage
+        info = infos[f"{prefix}data/{key}"]
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"{path}: tensor comprimido, no se puede mapear")
+        itemsize = np.dtype(dtype).itemsize
+        expected = tuple(int(np.prod(size[i + 1:])) for i in range(len(size)))
+        if tuple(stride) != expected:
+            raise ValueError(f"{path}: tensor no contiguo {stride}")
+        return np.memmap(path, dtype=dtype, mode="r",
+                         offset=_entry_offset(path, info) + storage_offset * itemsize,
+                         shape=tuple(size))
+
+    class _Unpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            if module == "torch._utils" and name == "_rebuild_tensor_v2":
+                return rebuild_tensor
+            if module == "torch" and name in _STORAGE_DTYPES:
+                return _STORAGE_DTYPES[name]
+            if module == "collections" and name == "OrderedDict":
+                return OrderedDict
+            raise pickle.UnpicklingError(f"{module}.{name} no permitido")
+
+        def persistent_load(self, pid):
+            # ('storage', tipo, clave, dispositivo, numel)
+            return (pid[1], pid[2])
+
+    return _Unpickler(io.BytesIO(pkl)).load()
+
+# Motor liviano de inferencia de topicos a partir de los artefactos de
+# BERTopic en ayuda/. El modelo guardado no tiene UMAP ni HDBSCAN, asi que
+# BERTopic.transform se reduce a la similitud coseno entre los embeddings
+# de los documentos y los de cada topico; aqui se hace con una sola
+# multiplicacion de matrices. Expone la misma firma que BERTopic.transform.
+class NumpyTopicEngine:
+
+    # Constructor de la clase
+    def __init__(self, folder: str = "ayuda"):
+        tensors = load_torch_tensors(os.path.join(folder, "topic_embeddings.bin"))
+        topic_embeddings = np.asarray(tensors["topic_embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(topic_embeddings, axis=1, keepdims=True)
+        # Matriz (n_topicos, dim) normalizada, contigua, lista para el producto
+        self.topic_embeddings = topic_embeddings / np.where(norms == 0, 1, norms)
+        with open(os.path.join(folder, "topics.json")) as f:
+            topics = json.load(f)
+        self._outliers = int(topics["_outliers"])
+        self.topic_labels = {int(k): v for k, v in topics["topic_labels"].items()}
+
+    # Retorna (topico predicho, probabilidades) por documento, igual que BERTopic.
+    # Requiere los embeddings de los documentos (del encoder del modelo)
+    def transform(self, documents, embeddings: np.ndarray | None = None):
+        if embeddings is None:
+            raise ValueError("NumpyTopicEngine necesita los embeddings de los documentos")
+        emb = np.asarray(embeddings, dtype=np.float32)
+        if emb.ndim == 1:
+            emb = emb[None, :]
+        norms = np.linalg.norm(emb, axis=1, keepdims=True)
+        sim = (emb / np.where(norms == 0, 1, norms)) @ self.topic_embeddings.T
+        predictions = np.argmax(sim, axis=1) - self._outliers
+        return predictions.tolist(), sim
+
+# Carga el modelo de topicos segun TOPIC_ENGINE: "numpy" (por defecto, sin
+# torch ni BERTopic) o "bertopic" (el modelo completo, para comparar)
+def load_topic_model(folder: str = "ayuda"):
+    engine = os.getenv("TOPIC_ENGINE", "numpy").lower()
+    if engine == "bertopic":
+        from bertopic import BERTopic
+        return BERTopic.load(folder)
+    if engine != "numpy":
+        raise ValueError(f"TOPIC_ENGINE desconocido: {engine}")
+    return NumpyTopicEngine(folder)
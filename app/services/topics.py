@@ -0,0 +1,154 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Sequence
+import numpy as np
+import anyio
+
+# Tamano de fragmento para inferir topicos en cargas muy grandes
+TOPICS_CHUNK_SIZE = int(os.getenv("TOPICS_CHUNK_SIZE", "256"))
+
+# Infiere los vectores de topicos de todos los textos con una llamada a
+# transform por fragmento. Se descarta la columna de outliers (-1), igual
+# que probs[0][1:] para un solo texto. Si se entregan los embeddings del
+# encoder de topicos, BERTopic no vuelve a codificar los textos.
+# Retorna una matriz (n, n_topicos)
+def transform_topics(
+    topic_model,
+    texts: Sequence[str],
+    chunk_size: int = TOPICS_CHUNK_SIZE,
+    embeddings: np.ndarray | None = None,
+) -> np.ndarray:
+    texts = list(texts)
+    parts = []
+    for i in range(0, len(texts), chunk_size):
+        chunk_emb = None if embeddings is None else embeddings[i:i + chunk_size]
+        _, probs = topic_model.transform(texts[i:i + chunk_size], embeddings=chunk_emb)
+        parts.append(np.asarray(probs, dtype=np.float32)[:, 1:])
+    if not parts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.concatenate(parts, axis=0)
+
+# Version asincrona: corre la inferencia en un thread para no bloquear el loop
+async def atransform_topics(
+    topic_model,
+    texts: Sequence[str],
+    chunk_size: int = TOPICS_CHUNK_SIZE,
+    embeddings: np.ndarray | None = None,
+) -> np.ndarray:
+    return await anyio.to_thread.run_sync(transform_topics, topic_model, texts, chunk_size, embeddings)
+
+# Version del modelo de topicos: cambia si cambian los artefactos o el encoder
+def topic_model_version(folder: str, encoder_name: str) -> str:
+    h = hashlib.sha1(encoder_name.encode("utf-8"))
+    for name in sorted(os.listdir(folder)):
+        st = os.stat(os.path.join(folder, name))
+        h.update(f"{name}:{st.st_size}:{int(st.st_mtime)}".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+# Cache LRU con TTL de vectores de topicos, por hash del texto y version del
+# modelo. Cada entrada puede tener duenos (p.ej. ("ideas", 7)) para poder
+# invalidarla cuando ese punto se vuelve a subir; al desalojar o expirar una
+# entrada se olvidan tambien sus duenos.
+class TopicVectorCache:
+
+    # Constructor de la clase
+    def __init__(self, version: str, max_items: int = 4096, ttl_seconds: float = 3600.0):
+        self.version = version
+        self.max_items = max_items
+        self.ttl = ttl_seconds
+        # clave -> (vencimiento, vector, duenos)
+        self._data: OrderedDict[str, tuple[float, np.ndarray, set]] = OrderedDict()
+        self._owners: dict[tuple, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.version}|{text}".encode("utf-8")).hexdigest()
+
+    # Quita una entrada junto con sus duenos
+    def _drop(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            for owner in entry[2]:
+                if self._owners.get(owner) == key:
+                    del self._owners[owner]
+
+    def get(self, text: str) -> np.ndarray | None:
+        key = self._key(text)
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, text: str, vector: np.ndarray, owner: tuple | None = None):
+        key = self._key(text)
+        previous = self._data.get(key)
+        owners = previous[2] if previous is not None else set()
+        self._data[key] = (time.monotonic() + self.ttl, vector, owners)
+        self._data.move_to_end(key)
+        if owner is not None:
+            old = self._owners.get(owner)
+            if old is not None and old != key and old in self._data:
+                self._data[old][2].discard(owner)
+            self._owners[owner] = key
+            owners.add(owner)
+        while len(self._data) > self.max_items:
+            self._drop(next(iter(self._data)))
+
+    # Borra la entrada asociada a un punto (idea o proyecto re-subido)
+    def invalidate(self, owner: tuple):
+        key = self._owners.get(owner)
+        if key is not None:
+            self._drop(key)
+
+    def stats(self) -> dict:
+        return {"items": len(self._data), "owners": len(self._owners), "hits": self.hits, "misses": self.misses, "version": self.version}
+
+# Inferencia de topicos compartida por ingesta y endpoints: modelo + cache.
+# Los textos se codifican con `encoder` (un EmbeddingsProvider, con su cache
+# en disco), asi cada documento pasa a lo mas una vez por cada modelo.
+class TopicInference:
+
+    # Constructor de la clase
+    def __init__(self, topic_model, cache: TopicVectorCache, encoder):
+        self.topic_model = topic_model
+        self.cache = cache
+        self.encoder = encoder
+
+    # True si los embeddings de `provider` sirven directamente para topicos
+    def shares_encoder(self, provider) -> bool:
+        return provider is self.encoder or provider.model_name == self.encoder.model_name
+
+    # Vectores de topicos de varios textos. `embeddings` son los del mismo
+    # texto ya calculados por el encoder compartido (ver shares_encoder)
+    async def vectors(self, texts: Sequence[str], embeddings: np.ndarray | None = None) -> np.ndarray:
+        texts = list(texts)
+        if embeddings is None:
+            embeddings = await self.encoder.embed_array(texts)
+        return await atransform_topics(self.topic_model, texts, embeddings=embeddings)
+
+    # Vector de topicos de un texto, reutilizando el cache
+    async def vector(
+        self,
+        text: str,
+        owner: tuple | None = None,
+        embedding: np.ndarray | None = None,
+    ) -> np.ndarray:
+        vec = self.cache.get(text)
+        if vec is None:
+            emb = None if embedding is None else np.asarray(embedding, dtype=np.float32)[None, :]
+            vec = (await self.vectors([text], emb))[0]
+            self.cache.put(text, vec, owner)
+        elif owner is not None:
+            self.cache.put(text, vec, owner)
+        return vec
+
+    def invalidate(self, owner: tuple):
+        self.cache.invalidate(owner)
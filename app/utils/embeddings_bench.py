@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+
+from app.services.embeddings_factory import build_provider
+
+# Compara un proveedor de embeddings contra el de referencia (sbert):
+# paridad (deriva de coseno por texto), acuerdo de vecinos y throughput.
+#   python -m app.utils.embeddings_bench --candidate onnx
+#   python -m app.utils.embeddings_bench --candidate onnx --texts proyectos.json
+
+# Carga los textos de prueba desde instrumentos.json, proyectos.json o una lista
+def _load_texts(path: str, limit: int) -> list[str]:
+    with open(path) as f:
+        data = json.load(f)
+    texts = []
+    for d in data:
+        if isinstance(d, str):
+            texts.append(d)
+        elif "Requisitos" in d:
+            from app.api.funds import _text_of_fund_dict
+            texts.append(_text_of_fund_dict(d))
+        else:
+            from app.api.projects import _text_of_proyect_dict
+            texts.append(_text_of_proyect_dict(d))
+    return texts[:limit]
+
+# Embeddea todos los textos y mide textos por segundo (tras un calentamiento)
+async def _timed_embed(provider, texts: list[str]) -> tuple[np.ndarray, float]:
+    await provider.embed_array(texts[:8])
+    start = time.perf_counter()
+    vectors = await provider.embed_array(texts)
+    return vectors, len(texts) / (time.perf_counter() - start)
+
+# Fraccion de vecinos top-k que coinciden entre ambos espacios
+def _neighbor_agreement(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    k = min(k, len(a) - 1)
+    if k <= 0:
+        return 1.0
+    def topk(m):
+        sims = m @ m.T
+        np.fill_diagonal(sims, -np.inf)
+        return np.argpartition(-sims, k, axis=1)[:, :k]
+    ta, tb = topk(a), topk(b)
+    return float(np.mean([len(set(x) & set(y)) / k for x, y in zip(ta, tb)]))
+
+def _unit(m: np.ndarray) -> np.ndarray:
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+async def run(reference: str, candidate: str, texts: list[str], k: int) -> dict:
+    ref_vecs, ref_tps = await _timed_embed(build_provider(reference), texts)
+    cand_vecs, cand_tps = await _timed_embed(build_provider(candidate), texts)
+    if ref_vecs.shape != cand_vecs.shape:
+        raise ValueError(f"Dimensiones distintas: {ref_vecs.shape} vs {cand_vecs.shape}")
+    ref_u, cand_u = _unit(ref_vecs), _unit(cand_vecs)
+    cos = np.sum(ref_u * cand_u, axis=1)
+    return {
+        "texts": len(texts),
+        "reference": {"provider": reference, "texts_per_sec": round(ref_tps, 2)},
+        "candidate": {"provider": candidate, "texts_per_sec": round(cand_tps, 2)},
+        "speedup": round(cand_tps / ref_tps, 2),
+        "cosine_drift": {
+            "mean": float(1 - cos.mean()),
+            "p95": float(1 - np.percentile(cos, 5)),
+            "max": float(1 - cos.min()),
+        },
+        f"neighbors_top{k}_agreement": _neighbor_agreement(ref_u, cand_u, k),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paridad y throughput entre proveedores de embeddings")
+    parser.add_argument("--reference", default="sbert")
+    parser.add_argument("--candidate", default="onnx")
+    parser.add_argument("--texts", default="instrumentos.json")
+    parser.add_argument("--limit", type=int, default=512)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--max-drift", type=float, default=0.02,
+                        help="Falla si la deriva media de coseno supera este valor")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.reference, args.candidate, _load_texts(args.texts, args.limit), args.k))
+    print(json.dumps(report, indent=2))
+    if report["cosine_drift"]["mean"] > args.max_drift:
+        raise SystemExit(f"Deriva media {report['cosine_drift']['mean']:.4f} > {args.max_drift}")
@@ -0,0 +1,32 @@
+import json
+from fastapi.responses import StreamingResponse
+
+from app.services.qdrant_store import aiter_payloads
+
+# Interpreta el cursor de la query: los IDs de los puntos son enteros o UUID
+def parse_cursor(cursor: str | None) -> int | str | None:
+    if cursor is None or cursor == "":
+        return None
+    return int(cursor) if cursor.isdigit() else cursor
+
+# Genera {"<key>": [payloads...], "next_cursor": ...} pagina a pagina,
+# sin armar la respuesta completa en memoria
+async def _json_chunks(collection: str, key: str, cursor, limit: int | None):
+    yield f'{{"{key}": ['
+    first = True
+    next_cursor = None
+    async for payloads, next_cursor in aiter_payloads(collection, cursor, limit):
+        if not payloads:
+            continue
+        chunk = ",".join(json.dumps(p, ensure_ascii=False, default=str) for p in payloads)
+        yield chunk if first else "," + chunk
+        first = False
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+# Respuesta en streaming con los payloads de una coleccion.
+# Sin limit se recorre toda la coleccion; con limit se pagina usando next_cursor
+def stream_collection(collection: str, key: str, cursor: str | None, limit: int | None) -> StreamingResponse:
+    return StreamingResponse(
+        _json_chunks(collection, key, parse_cursor(cursor), limit),
+        media_type="application/json",
+    )
@@ -0,0 +1,91 @@
+import numpy as np
+from app.services.affinity_store import AffinityStore, FUSIONS, _enabled_from_env
+from app.services.match_cache import match_cache
+from app.services import qdrant_store
+from app.services.qdrant_store import SEMANTIC, TOPIC, ensure_collection, upsert_vectors
+
+def _unit(m):
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+def _top(store, idea_id, fusion, k):
+    ids, _, sem, top, floors = store.candidates(idea_id)
+    ws, wt = FUSIONS[fusion]
+    score = ws * sem[0] + wt * top[0]
+    order = np.argsort(-score, kind="stable")[:k]
+    return [ids[j] for j in order], score[order], floors[fusion]
+
+# El top-k guardado coincide con el calculado contra todos los fondos, y los
+# fondos que quedaron fuera nunca superan el piso
+def test_candidates_match_brute_force_and_incremental_updates():
+    rng = np.random.default_rng(0)
+    funds_s, funds_t = rng.normal(size=(60, 8)), rng.normal(size=(60, 5))
+    ideas_s, ideas_t = rng.normal(size=(10, 8)), rng.normal(size=(10, 5))
+    store = AffinityStore(top_n=5)
+    store.load(list(range(60)), funds_s, funds_t, [{}] * 60, list(range(100, 110)), ideas_s, ideas_t)
+    # Un fondo cambia y uno nuevo entra; una idea cambia (como en upsert_vectors,
+    # primero se registra la escritura en match_cache)
+    funds_s[3], funds_t[3] = ideas_s[0] * 5, ideas_t[0] * 5
+    match_cache.touch("funds")
+    store.put_funds([3, 60], np.stack([funds_s[3], ideas_s[1]]), np.stack([funds_t[3], ideas_t[1]]), [{}, {}])
+    funds_s, funds_t = np.vstack([funds_s, ideas_s[1]]), np.vstack([funds_t, ideas_t[1]])
+    ideas_s[2] = rng.normal(size=8)
+    match_cache.touch("ideas", [102])
+    store.put_ideas([102], ideas_s[2:3], ideas_t[2:3])
+    for n, idea_id in enumerate(range(100, 110)):
+        for fusion, (ws, wt) in FUSIONS.items():
+            full = ws * (_unit(ideas_s[n:n + 1]) @ _unit(funds_s).T)[0] + wt * (_unit(ideas_t[n:n + 1]) @ _unit(funds_t).T)[0]
+            ids, scores, floor = _top(store, idea_id, fusion, 5)
+            assert ids == list(np.argsort(-full, kind="stable")[:5])
+            np.testing.assert_allclose(scores, np.sort(full)[::-1][:5], atol=1e-5)
+            assert np.sort(full)[::-1][5] <= floor + 1e-6
+    assert _top(store, 100, "funds", 1)[0] == [3]
+    assert _top(store, 101, "funds", 1)[0] == [60]
+
+# Una escritura que el store no vio (otro proceso) deja la idea desactualizada
+def test_stale_generations_fall_back():
+    store = AffinityStore(top_n=2)
+    store.load([1, 2], np.eye(2), np.eye(2), [{}, {}], ["stale_idea"], np.eye(2)[:1], np.eye(2)[:1])
+    assert store.candidates("stale_idea") is not None
+    match_cache.touch("ideas", ["stale_idea"])
+    assert store.candidates("stale_idea") is None
+    store.put_ideas(["stale_idea"], np.eye(2)[:1], np.eye(2)[:1])
+    assert store.candidates("stale_idea") is not None
+    match_cache.touch("funds")
+    assert store.candidates("stale_idea") is None
+
+# Una escritura de otro proceso sube gen:funds sin pasar por put_funds: la
+# matriz quedaria vencida para siempre, por eso no se activa con varios
+# procesos ni con generaciones compartidas
+def test_disabled_when_other_processes_write(monkeypatch):
+    assert _enabled_from_env()
+    store = AffinityStore(top_n=2)
+    store.load([1, 2], np.eye(2), np.eye(2), [{}, {}], ["external"], np.eye(2)[:1], np.eye(2)[:1])
+    match_cache.backend.incr(["gen:funds"])
+    assert store.candidates("external") is None and store.fund_attributes([1]) is None
+    monkeypatch.setattr(match_cache.backend, "shared", True)
+    assert not _enabled_from_env()
+    monkeypatch.setattr(match_cache.backend, "shared", False)
+    monkeypatch.setenv("QDRANT_MODE", "server")
+    assert not _enabled_from_env()
+
+# Las escrituras en Qdrant mantienen al dia la matriz compartida
+def test_qdrant_writes_update_store():
+    store = qdrant_store.affinity_store
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    ensure_collection("ideas", {SEMANTIC: 8, TOPIC: 5})
+    rng = np.random.default_rng(2)
+    upsert_vectors("ideas", [501], {SEMANTIC: rng.normal(size=(1, 8)), TOPIC: rng.normal(size=(1, 5))}, [{}])
+    try:
+        qdrant_store.load_affinity_store()
+        assert store.candidates(501) is not None
+        idea = qdrant_store.client.retrieve("ideas", [501], with_vectors=True)[0]
+        upsert_vectors("funds", [777], {
+            SEMANTIC: np.asarray([qdrant_store.named_vector(idea, SEMANTIC)]),
+            TOPIC: np.asarray([qdrant_store.named_vector(idea, TOPIC)]),
+        }, [{"Titulo": "nuevo"}])
+        ids, payloads, sem, top, _ = store.candidates(501)
+        j = ids.index(777)
+        assert payloads[777]["Titulo"] == "nuevo"
+        np.testing.assert_allclose([sem[0, j], top[0, j]], [1.0, 1.0], atol=1e-5)
+    finally:
+        store.discard("funds")
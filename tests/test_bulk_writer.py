@@ -0,0 +1,25 @@
+import asyncio
+import numpy as np
+from app.services.qdrant_store import client, ensure_collection
+from app.services.bulk_writer import BulkWriter, bulk_index
+
+def test_bulk_index_embeds_in_batches_and_writes_everything():
+    ensure_collection("bulk", 2)
+    sizes = []
+    async def embed(batch):
+        sizes.append(len(batch))
+        return np.ones((len(batch), 2), dtype=np.float32)
+    payloads = [{"ID": i} for i in range(1, 251)]
+    stats = asyncio.run(bulk_index("bulk", list(range(1, 251)), payloads, embed, batch_size=100))
+    assert sizes == [100, 100, 50]
+    assert stats["points"] == 250
+    assert client.count("bulk").count == 250
+
+def test_submit_splits_named_vectors_and_flush_waits():
+    ensure_collection("bulk_named", {"a": 2, "b": 3})
+    async def run():
+        writer = BulkWriter("bulk_named", batch_size=4, max_inflight=1)
+        await writer.submit(list(range(10)), {"a": np.ones((10, 2)), "b": np.ones((10, 3))}, [{}] * 10)
+        return await writer.flush()
+    assert asyncio.run(run())["points"] == 10
+    assert client.count("bulk_named").count == 10
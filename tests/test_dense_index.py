@@ -0,0 +1,77 @@
+import numpy as np
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchText
+from qdrant_client.models import Record
+from app.services.dense_index import DenseIndex, filter_mask
+from app.services import qdrant_store
+from app.services.qdrant_store import (
+    SEMANTIC, TOPIC, client, ensure_collection, upsert_vectors, build_filter,
+    search_funds_hybrid_batch, search_projects_batch,
+)
+
+def _funds(rng, n=40):
+    payloads = [{"ID": i, "Estado": "abierto" if i % 2 else "cerrado",
+                 "Regiones": ["Maule"] if i % 3 else ["Biobio"],
+                 "MontoMinimo": i, "MontoMaximo": i + 10,
+                 "FechaDeApertura": "2025-01-01", "FechaDeCierre": "2025-12-31"} for i in range(1, n + 1)]
+    upsert_vectors("funds", list(range(1, n + 1)), {
+        SEMANTIC: rng.normal(size=(n, 8)), TOPIC: rng.normal(size=(n, 5)),
+    }, payloads)
+
+# El backend NumPy debe dar los mismos hits y puntajes que Qdrant
+def test_numpy_backend_matches_qdrant(monkeypatch):
+    rng = np.random.default_rng(0)
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    _funds(rng)
+    sem, top = rng.normal(size=(3, 8)), rng.normal(size=(3, 5))
+    qf = Filter(must=build_filter(estado="abierto", monto=15, fecha="2025-06-01").must
+                + [FieldCondition(key="Regiones", match=MatchAny(any=["Maule"]))])
+    for flt in (None, qf):
+        dense = search_funds_hybrid_batch(sem, top, top_k=5, must_filter=flt)
+        monkeypatch.setattr(qdrant_store, "NUMPY_SEARCH_MAX_POINTS", 0)
+        exact = search_funds_hybrid_batch(sem, top, top_k=5, must_filter=flt)
+        monkeypatch.setattr(qdrant_store, "NUMPY_SEARCH_MAX_POINTS", 5000)
+        for (ds, dt), (qs, qt) in zip(dense, exact):
+            assert [h.id for h in ds] == [h.id for h in qs]
+            assert [h.id for h in dt] == [h.id for h in qt]
+            np.testing.assert_allclose([h.score for h in ds], [h.score for h in qs], atol=1e-5)
+
+def test_index_rebuilds_after_writes_and_respects_threshold(monkeypatch):
+    ensure_collection("similar_projects", 4)
+    upsert_vectors("similar_projects", [1], np.array([[1, 0, 0, 0]]), [{"ID": 1}])
+    assert search_projects_batch(np.array([[1, 0, 0, 0]]), top_k=3)[0][0].id == 1
+    upsert_vectors("similar_projects", [2], np.array([[0, 1, 0, 0]]), [{"ID": 2}])
+    assert search_projects_batch(np.array([[0, 1, 0, 0]]), top_k=1)[0][0].id == 2
+    monkeypatch.setattr(qdrant_store, "NUMPY_SEARCH_MAX_POINTS", 1)
+    qdrant_store.invalidate_dense_index("similar_projects")
+    assert qdrant_store.dense_index("similar_projects") is None
+    assert search_projects_batch(np.array([[0, 1, 0, 0]]), top_k=1)[0][0].id == 2
+
+# Los vectores guardados (para el rescoring exacto) son iguales por ambos caminos
+def test_point_vectors_same_from_index_and_qdrant(monkeypatch):
+    rng = np.random.default_rng(1)
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    _funds(rng)
+    ids = [7, 3, 99, 12]
+    dense = qdrant_store.point_vectors("funds", ids[:2] + ids[3:], [SEMANTIC, TOPIC])
+    monkeypatch.setattr(qdrant_store, "NUMPY_SEARCH_MAX_POINTS", 0)
+    qdrant_store.invalidate_dense_index("funds")
+    stored = qdrant_store.point_vectors("funds", ids, [SEMANTIC, TOPIC])
+    for name in (SEMANTIC, TOPIC):
+        np.testing.assert_allclose(stored[name][[0, 1, 3]], dense[name], atol=1e-6)
+        assert not stored[name][2].any()
+
+# Una condicion que NumPy no evalua manda la busqueda a Qdrant
+def test_filter_mask_unsupported_condition():
+    payloads = [{"Titulo": "agua"}, {"Titulo": "riego"}]
+    flt = Filter(must=[FieldCondition(key="Titulo", match=MatchText(text="agua"))])
+    assert filter_mask(payloads, flt) is None
+    flt = Filter(must=[FieldCondition(key="Titulo", match=MatchAny(any=["riego"]))])
+    assert filter_mask(payloads, flt).tolist() == [False, True]
+
+# Un punto sin alguno de los vectores desalinearia las filas: no se arma el indice
+def test_from_records_requires_every_named_vector():
+    full = [Record(id=i, vector={SEMANTIC: [1.0, float(i)], TOPIC: [float(i), 1.0]}, payload={"ID": i}) for i in (1, 2)]
+    index = DenseIndex.from_records(full)
+    assert index.search(SEMANTIC, [1.0, 2.0], 1)[0][0].id == 2
+    partial = [Record(id=3, vector={TOPIC: [0.0, 1.0]}, payload={"ID": 3})] + full
+    assert DenseIndex.from_records(partial) is None
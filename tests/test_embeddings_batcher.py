@@ -0,0 +1,49 @@
+import asyncio
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+from app.services.embeddings_batcher import BatchingEmbeddings
+
+# Proveedor falso que registra cada lote recibido
+class RecordingProv(EmbeddingsProvider):
+    def __init__(self):
+        self.calls = []
+    async def embed_array(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+
+def test_concurrent_calls_share_one_batch():
+    inner = RecordingProv()
+    prov = BatchingEmbeddings(inner, max_wait_ms=10, max_batch=8)
+    async def run():
+        return await asyncio.gather(
+            prov.embed(["a"]), prov.embed(["bbb"]), prov.embed(["a"]), prov.embed(["cc", "a"])
+        )
+    out = asyncio.run(run())
+    assert out == [[[1.0]], [[3.0]], [[1.0]], [[2.0], [1.0]]]
+    assert inner.calls == [["a", "bbb", "cc"]]
+
+def test_full_batch_flushes_without_waiting():
+    inner = RecordingProv()
+    prov = BatchingEmbeddings(inner, max_wait_ms=10_000, max_batch=2)
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(prov.embed(["a"]), prov.embed(["b"])), 1)
+    assert asyncio.run(run()) == [[[1.0]], [[1.0]]]
+    assert inner.calls == [["a", "b"]]
+
+# Si el lote en curso se cancela, las llamadas que lo esperan terminan
+def test_cancelled_batch_releases_waiters():
+    class SlowProv(RecordingProv):
+        async def embed_array(self, texts):
+            await asyncio.sleep(10)
+    prov = BatchingEmbeddings(SlowProv(), max_wait_ms=1, max_batch=8)
+    async def run():
+        call = asyncio.ensure_future(prov.embed(["a"]))
+        await asyncio.sleep(0.05)
+        for task in list(prov._tasks):
+            task.cancel()
+        try:
+            await asyncio.wait_for(call, 1)
+        except asyncio.CancelledError:
+            return "cancelado"
+    assert asyncio.run(run()) == "cancelado"
+    assert not prov._inflight
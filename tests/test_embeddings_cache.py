@@ -0,0 +1,69 @@
+import json
+import asyncio
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+from app.services.embeddings_cache import EmbeddingCache, CachedEmbeddings
+
+# Proveedor falso que cuenta los textos que pasan por el "modelo"
+class CountingProv(EmbeddingsProvider):
+    model_name = "fake"
+    def __init__(self):
+        self.seen = []
+    async def embed_array(self, texts):
+        self.seen.extend(texts)
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+def test_cache_hits_skip_model(tmp_path):
+    inner = CountingProv()
+    prov = CachedEmbeddings(inner, EmbeddingCache(str(tmp_path), "fake", True, max_items=10))
+    first = asyncio.run(prov.embed(["a", "bb", "a"]))
+    second = asyncio.run(prov.embed(["bb", "a"]))
+    assert inner.seen == ["a", "bb"]
+    assert first == [[1.0, 1.0, 0.0], [2.0, 1.0, 0.0], [1.0, 1.0, 0.0]]
+    assert second == [[2.0, 1.0, 0.0], [1.0, 1.0, 0.0]]
+    assert prov.stats()["cache"]["hits"] == 2
+
+def test_cache_persists_and_evicts(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake", True, max_items=4)
+    texts = [f"t{i}" for i in range(4)]
+    cache.put_many(texts, np.eye(4, dtype=np.float32))
+    cache.get_many(["t0"])
+    cache.put_many(["t4"], np.ones((1, 4), dtype=np.float32))
+    cache.close()
+    # Se desaloja el menos usado (t1), t0 sigue vivo
+    reopened = EmbeddingCache(str(tmp_path), "fake", True, max_items=4)
+    got = reopened.get_many(["t0", "t1", "t4"])
+    assert got[1] is None
+    np.testing.assert_array_equal(got[0], [1, 0, 0, 0])
+    np.testing.assert_array_equal(got[2], [1, 1, 1, 1])
+    # Otro modelo no comparte el cache
+    assert EmbeddingCache(str(tmp_path), "otro", True, max_items=4).get_many(["t0"]) == [None]
+
+# Dos procesos sobre la misma carpeta usan shards distintos; las escrituras
+# se agrupan hasta el flush (periodico o al cerrar)
+def test_cache_shards_and_deferred_flush(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "fake", True, max_items=4, flush_seconds=3600)
+    second = EmbeddingCache(str(tmp_path), "fake", True, max_items=4, flush_seconds=3600)
+    assert first._index_path != second._index_path
+    first.put_many(["a"], np.ones((1, 2), dtype=np.float32))
+    second.put_many(["b"], np.zeros((1, 2), dtype=np.float32))
+    assert not (tmp_path / first._index_path).exists()
+    second.close()
+    first.close()
+    reopened = EmbeddingCache(str(tmp_path), "fake", True, max_items=4)
+    np.testing.assert_array_equal(reopened.get_many(["a"])[0], [1, 1])
+
+# Al reutilizar filas desalojadas, el indice en disco ya no las referencia:
+# sin cerrar (como si el proceso cayera) cada clave persistida apunta a su vector
+def test_evicted_rows_are_persisted_before_reuse(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "fake", True, max_items=4, flush_seconds=3600)
+    cache.put_many([f"t{i}" for i in range(4)], np.eye(4, dtype=np.float32) + 1)
+    cache.put_many(["nuevo"], np.full((1, 4), 9, dtype=np.float32))
+    with open(cache._index_path) as f:
+        index = json.load(f)["index"]
+    matrix = np.memmap(cache._data_path, dtype=np.float32, mode="r", shape=(4, 4))
+    assert EmbeddingCache.key("t0") not in index
+    for i in range(1, 4):
+        slot = index[EmbeddingCache.key(f"t{i}")][0]
+        np.testing.assert_array_equal(matrix[slot], np.eye(4)[i] + 1)
+    np.testing.assert_array_equal(cache.get_many(["nuevo"])[0], np.full(4, 9))
@@ -0,0 +1,41 @@
+import numpy as np
+from app.models.instrumento import Instrumento
+from app.services.fund_attributes import FundAttributes
+from app.services.dense_index import filter_mask
+from app.services.qdrant_store import build_filter
+
+# Payloads como los que se guardan en Qdrant (Instrumento.model_dump())
+def _payloads(rng, n=300):
+    perfiles = [f"Perfil {i}" for i in range(90)]
+    return [Instrumento(
+        ID=i, Titulo=f"Fondo {i}", Financiador=1, Alcance="Nacional", Descripcion="",
+        FechaDeApertura="2025-08-01", FechaDeCierre="2025-10-15", DuracionEnMeses=12,
+        Beneficios="", Requisitos="", MontoMinimo=i, MontoMaximo=i + 50,
+        Estado="abierto" if i % 3 else "cerrado", TipoDeBeneficio="Subsidio",
+        TipoDePerfil=str(rng.choice(perfiles)), EnlaceDelDetalle="", EnlaceDeLaFoto="",
+    ).model_dump() for i in range(n)]
+
+# Los bitsets responden lo mismo que comparar cada payload (vocabulario de mas de 64 valores)
+def test_any_of_matches_payloads():
+    rng = np.random.default_rng(0)
+    payloads = _payloads(rng)
+    attrs = FundAttributes.from_payloads(payloads[:200])
+    attrs.set(np.arange(200, 300), payloads[200:])
+    payloads[5] = {**payloads[5], "TipoDePerfil": "nuevo"}
+    attrs.set([5], [payloads[5]])
+    for wanted in (["Perfil 1", "Perfil 70"], ["nuevo"], ["no-existe"], ["Perfil 89"]):
+        expected = [p["TipoDePerfil"] in wanted for p in payloads]
+        assert attrs.any_of("TipoDePerfil", wanted).tolist() == expected
+    assert attrs.declares("TipoDePerfil").all()
+    assert attrs.any_of("Estado", ["cerrado"]).tolist() == [p["Estado"] == "cerrado" for p in payloads]
+    sub = attrs.take([5, 0])
+    assert sub.any_of("TipoDePerfil", ["nuevo"]).tolist() == [True, False]
+
+# El prefiltro con bitsets da la misma mascara que evaluar cada payload
+def test_filter_mask_with_attributes():
+    rng = np.random.default_rng(1)
+    payloads = _payloads(rng)
+    attrs = FundAttributes.from_payloads(payloads)
+    qf = build_filter(estado="abierto", monto=120, tipos_perfil=[f"Perfil {i}" for i in range(30)])
+    np.testing.assert_array_equal(filter_mask(payloads, qf, attrs), filter_mask(payloads, qf))
+    assert filter_mask(payloads, qf).any()
@@ -0,0 +1,32 @@
+import numpy as np
+from app.services import qdrant_store
+from app.services.qdrant_store import SEMANTIC, TOPIC, client, ensure_collection, upsert_vectors, search_funds_hybrid_batch
+
+PROFILE = {"m": 32, "ef_construct": 200, "ef": 128, "quantize": True, "oversampling": 3.0, "on_disk": True}
+
+# El perfil de la coleccion llega a la configuracion de HNSW y cuantizacion
+def test_profile_reaches_collection_config(monkeypatch):
+    monkeypatch.setitem(qdrant_store.INDEX_PROFILES, "profiled", {"": PROFILE})
+    ensure_collection("profiled", 4)
+    params = client.get_collection("profiled").config.params.vectors
+    assert (params.hnsw_config.m, params.hnsw_config.ef_construct) == (32, 200)
+    assert params.quantization_config.scalar.type == "int8"
+    assert params.on_disk is True
+
+# Y al buscar en Qdrant se envian ef y el rescoring de la cuantizacion
+def test_search_params_sent_at_query_time(monkeypatch):
+    monkeypatch.setitem(qdrant_store.INDEX_PROFILES, "funds", {SEMANTIC: PROFILE})
+    monkeypatch.setattr(qdrant_store, "NUMPY_SEARCH_MAX_POINTS", 0)
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    upsert_vectors("funds", [1], {SEMANTIC: np.ones((1, 8)), TOPIC: np.ones((1, 5))}, [{}])
+    sent = []
+    query = client.query_batch_points
+    def recording(collection_name, requests, **kwargs):
+        sent.extend(requests)
+        return query(collection_name=collection_name, requests=requests, **kwargs)
+    monkeypatch.setattr(client, "query_batch_points", recording)
+    search_funds_hybrid_batch(np.ones((1, 8)), np.ones((1, 5)), top_k=1)
+    semantic, topic = sent
+    assert semantic.params.hnsw_ef == 128
+    assert semantic.params.quantization.rescore and semantic.params.quantization.oversampling == 3.0
+    assert topic.params is None
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import numpy as np
+import pytest
+from app.services.match_cache import MatchCache, LocalBackend
+from app.services import qdrant_store
+from app.services.qdrant_store import ensure_collection, upsert_vectors
+
+def test_key_changes_with_catalog_and_idea_generation():
+    cache = MatchCache(LocalBackend())
+    params = {"endpoint": "match", "top_k": 5}
+    key = cache.key("ideas", 7, params)
+    cache.put(key, [{"call_id": 1}])
+    assert cache.get(cache.key("ideas", 7, params)) == [{"call_id": 1}]
+    assert cache.key("ideas", 7, {**params, "top_k": 6}) != key
+    # Otra idea no afecta; la misma idea o el catalogo si
+    cache.touch("ideas", [8])
+    assert cache.key("ideas", 7, params) == key
+    cache.touch("ideas", [7])
+    key2 = cache.key("ideas", 7, params)
+    assert key2 != key and cache.get(key2) is None
+    cache.touch("funds", [1])
+    assert cache.key("ideas", 7, params) != key2
+    cache.touch("ideas")
+    assert cache.key("ideas", 8, params) != key
+
+def test_disabled_cache_never_hits():
+    cache = MatchCache(LocalBackend(), enabled=False)
+    cache.put("k", [1])
+    assert cache.get("k") is None
+
+# Las escrituras en Qdrant suben las generaciones del cache global
+def test_store_writes_bump_generations():
+    ensure_collection("cached_ideas", 2)
+    key = qdrant_store.match_cache.key("cached_ideas", 1, {})
+    upsert_vectors("cached_ideas", [1], np.ones((1, 2)), [{}])
+    assert qdrant_store.match_cache.key("cached_ideas", 1, {}) != key
+
+# Con Qdrant en server las generaciones locales no se comparten entre workers
+def test_server_mode_requires_shared_generations(monkeypatch):
+    monkeypatch.setenv("QDRANT_MODE", "server")
+    monkeypatch.setenv("MATCH_CACHE", "shared")
+    monkeypatch.setenv("MATCH_CACHE_URL", "redis://127.0.0.1:1/0")
+    with pytest.raises(RuntimeError):
+        MatchCache.from_env()
+    monkeypatch.setenv("MATCH_CACHE", "local")
+    cache = MatchCache.from_env()
+    assert not cache.shared and cache.ttl == 30
+    monkeypatch.setenv("QDRANT_MODE", "memory")
+    assert MatchCache.from_env().ttl == 3600
+
+# Backend "compartido" en memoria que registra el thread de cada llamada
+class ThreadRecordingBackend(LocalBackend):
+    shared = True
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+    def counters(self, names):
+        self.threads.add(threading.get_ident())
+        return super().counters(names)
+
+# Con un backend de red las llamadas de los endpoints no corren en el event loop
+def test_async_api_runs_shared_backend_off_loop():
+    cache = MatchCache(ThreadRecordingBackend())
+    async def run():
+        key = await cache.akey("ideas", 3, {"k": 1})
+        await cache.aput(key, [1])
+        return key, await cache.aget_many([key, "otra"]), threading.get_ident()
+    key, got, loop_thread = asyncio.run(run())
+    assert cache.backend.threads and loop_thread not in cache.backend.threads
+    assert got == [[1], None]
+    assert key == cache.key("ideas", 3, {"k": 1})
@@ -0,0 +1,36 @@
+import asyncio
+import numpy as np
+from app.models.instrumento import Instrumento
+from app.models.match_request import MatchRequest
+from app.models.match_batch_request import MatchBatchRequest
+from app.services.qdrant_store import SEMANTIC, TOPIC, ensure_collection, upsert_vectors, build_filter
+from app.services.matching import match_ideas
+
+def _funds(rng, n=40):
+    payloads = [Instrumento(
+        ID=i, Titulo=f"Fondo {i}", Financiador=i % 4, Alcance="Nacional", Descripcion="",
+        FechaDeApertura="2025-01-01", FechaDeCierre="2025-12-31", DuracionEnMeses=12,
+        Beneficios="", Requisitos="", MontoMinimo=1, MontoMaximo=100,
+        Estado="abierto" if i % 5 else "cerrado", TipoDeBeneficio="Subsidio",
+        TipoDePerfil="Pyme" if i % 2 else "Persona Jurídica", EnlaceDelDetalle="", EnlaceDeLaFoto="",
+    ).model_dump() for i in range(1, n + 1)]
+    upsert_vectors("funds", list(range(1, n + 1)), {
+        SEMANTIC: rng.normal(size=(n, 8)), TOPIC: rng.normal(size=(n, 5)),
+    }, payloads)
+
+# El match en lote de /ia/match/batch da lo mismo que /ia/match idea por idea
+def test_batch_ranking_equals_single_idea_ranking():
+    rng = np.random.default_rng(3)
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    _funds(rng)
+    sem, top = rng.normal(size=(4, 8)), rng.normal(size=(4, 5))
+    batch_req = MatchBatchRequest(idea_ids=[1, 2, 3, 4], top_k=5, tipos_perfil=["Pyme"])
+    qf = build_filter(estado=batch_req.estado)
+    batch = asyncio.run(match_ideas(sem, top, batch_req, qf))
+    for n in range(4):
+        req = MatchRequest(idea_id=n + 1, top_k=5, tipos_perfil=["Pyme"])
+        single = asyncio.run(match_ideas(sem[n], top[n], req, qf))[0]
+        assert [m.call_id for m in batch[n]] == [m.call_id for m in single]
+        np.testing.assert_allclose([m.affinity for m in batch[n]], [m.affinity for m in single], atol=1e-5)
+        assert [m.explanations for m in batch[n]] == [m.explanations for m in single]
+    assert any(m.explanations for row in batch for m in row)
@@ -0,0 +1,38 @@
+import os
+import asyncio
+import numpy as np
+import pytest
+from app.services.embeddings_base import EmbeddingsProvider
+from app.services.providers.multiprocess_embeddings import MultiProcessEmbeddings
+
+# Proveedor base barato: el vector es (numero del texto, pid del worker)
+class ShardProv(EmbeddingsProvider):
+    model_name = "fake"
+    normalize = False
+    truncated = 0
+    def _ensure_model(self):
+        pass
+    def encode_sync(self, texts):
+        return np.array([[float(t), float(os.getpid())] for t in texts], dtype=np.float32)
+    async def embed_array(self, texts):
+        return self.encode_sync(texts)
+
+def make_shard_prov():
+    return ShardProv()
+
+# Los fragmentos se reparten entre procesos y vuelven en el orden original
+def test_shards_come_back_in_input_order(monkeypatch):
+    monkeypatch.setenv("EMBEDDINGS_WORKERS", "3")
+    monkeypatch.setenv("EMBEDDINGS_MP_MIN_SHARD", "10")
+    prov = MultiProcessEmbeddings(factory=make_shard_prov)
+    try:
+        out = asyncio.run(prov.embed_array([str(i) for i in range(95)]))
+    finally:
+        prov.close()
+    assert out[:, 0].tolist() == list(range(95))
+    assert os.getpid() not in out[:, 1]
+
+def test_multiprocess_base_is_rejected(monkeypatch):
+    monkeypatch.setenv("EMBEDDINGS_MP_BASE", "multiprocess")
+    with pytest.raises(ValueError):
+        MultiProcessEmbeddings()
@@ -0,0 +1,63 @@
+import datetime
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from app.models.instrumento import Instrumento
+from app.models.match_request import MatchRequest
+from qdrant_client.models import PayloadSchemaType
+from app.services import qdrant_store
+from app.services.qdrant_store import SEMANTIC, TOPIC, client, upsert_vectors, ensure_collection, build_filter
+
+def test_build_filter_amount_and_date_ranges():
+    ensure_collection("filtered", 2)
+    payloads = [
+        {"Estado": "abierto", "MontoMinimo": 1, "MontoMaximo": 10,
+         "FechaDeApertura": "2025-08-01", "FechaDeCierre": "2025-10-15"},
+        {"Estado": "abierto", "MontoMinimo": 20, "MontoMaximo": 50,
+         "FechaDeApertura": "2025-08-01", "FechaDeCierre": "2025-10-15"},
+        {"Estado": "abierto", "MontoMinimo": 1, "MontoMaximo": 10,
+         "FechaDeApertura": "2025-11-01", "FechaDeCierre": "2025-12-15"},
+    ]
+    upsert_vectors("filtered", [1, 2, 3], np.ones((3, 2)), payloads)
+    qf = build_filter(estado="abierto", monto=5, fecha="2025-09-01")
+    hits = client.query_points("filtered", query=[1.0, 1.0], query_filter=qf).points
+    assert [h.id for h in hits] == [1]
+
+def _instrumento(i: int, perfil: str) -> dict:
+    return Instrumento(
+        ID=i, Titulo=f"Fondo {i}", Financiador=1, Alcance="Nacional", Descripcion="",
+        FechaDeApertura="2025-08-01", FechaDeCierre="2025-10-15", DuracionEnMeses=12,
+        Beneficios="", Requisitos="", MontoMinimo=1, MontoMaximo=10, Estado="abierto",
+        TipoDeBeneficio="Subsidio", TipoDePerfil=perfil, EnlaceDelDetalle="", EnlaceDeLaFoto="",
+    ).model_dump()
+
+# El filtro de perfil usa el campo TipoDePerfil de los instrumentos
+def test_build_filter_profile_type_on_fund_payloads():
+    ensure_collection("filtered_profiles", 2)
+    upsert_vectors("filtered_profiles", [1, 2], np.ones((2, 2)),
+                   [_instrumento(1, "Empresa"), _instrumento(2, "Persona")])
+    qf = build_filter(tipos_perfil=["Persona"], fecha=datetime.date(2025, 9, 1))
+    hits = client.query_points("filtered_profiles", query=[1.0, 1.0], query_filter=qf).points
+    assert [h.id for h in hits] == [2]
+
+# Una fecha mal formada se rechaza al validar el request (422), no en Qdrant
+def test_match_request_rejects_malformed_date():
+    assert MatchRequest(idea_id=1, fecha="2025-09-01").fecha == datetime.date(2025, 9, 1)
+    with pytest.raises(ValidationError):
+        MatchRequest(idea_id=1, fecha="01/09/2025")
+
+# En modo server se crean los indices de payload que usa build_filter en funds
+def test_server_mode_creates_fund_payload_indexes(monkeypatch):
+    created = {}
+    monkeypatch.setattr(qdrant_store, "QDRANT_MODE", "server")
+    monkeypatch.setattr(client, "create_payload_index",
+                        lambda collection_name, field_name, field_schema, wait: created.__setitem__(field_name, field_schema))
+    ensure_collection("funds", {SEMANTIC: 8, TOPIC: 5})
+    assert created == {
+        "Estado": PayloadSchemaType.KEYWORD,
+        "TipoDePerfil": PayloadSchemaType.KEYWORD,
+        "MontoMinimo": PayloadSchemaType.INTEGER,
+        "MontoMaximo": PayloadSchemaType.INTEGER,
+        "FechaDeApertura": PayloadSchemaType.DATETIME,
+        "FechaDeCierre": PayloadSchemaType.DATETIME,
+    }
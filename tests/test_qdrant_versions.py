@@ -0,0 +1,79 @@
+import asyncio
+import numpy as np
+import pytest
+from app.services.qdrant_store import (
+    client, ingest_version, upsert_vectors, aload_collection, physical_collection,
+    acquire_ingest_lock, release_ingest_lock,
+)
+
+def _loader(calls, ids=(1,)):
+    async def load(collection):
+        calls.append(collection)
+        upsert_vectors(collection, list(ids), np.ones((len(ids), 3)), [{"fuente": True}] * len(ids))
+    return load
+
+async def _embed(payloads):
+    return np.full((len(payloads), 3), 2.0)
+
+def _load(name, version, vectors, load, embed=_embed):
+    return asyncio.run(aload_collection(name, 3, version, vectors, load, embed))
+
+def test_load_skips_only_matching_populated_version(tmp_path):
+    source = tmp_path / "datos.json"
+    source.write_text("[1]")
+    v1 = ingest_version([str(source)], modelo="a", vectors=3)
+    calls = []
+    assert _load("versioned", v1, "m1", _loader(calls))
+    assert _load("versioned", v1, "m1", _loader(calls)) is False
+    assert len(calls) == 1 and physical_collection("versioned") == calls[0]
+    # Cambia el archivo fuente: nueva version en otra coleccion fisica
+    source.write_text("[2]")
+    v2 = ingest_version([str(source)], modelo="a", vectors=3)
+    assert v2 != v1
+    assert _load("versioned", v2, "m1", _loader(calls))
+    assert physical_collection("versioned") == calls[1] != calls[0]
+    assert not client.collection_exists(calls[0])
+
+# Los puntos escritos en runtime sobreviven al cambio de version: copiados
+# si los modelos no cambiaron, re-vectorizados si cambiaron
+def test_runtime_points_are_kept():
+    calls = []
+    _load("kept", "v1", "m1", _loader(calls))
+    upsert_vectors("kept", [99], np.array([[3.0, 0, 0]]), [{"runtime": True}])
+    _load("kept", "v2", "m1", _loader(calls))
+    rec = client.retrieve("kept", [99], with_vectors=True, with_payload=True)[0]
+    assert rec.payload == {"runtime": True}
+    np.testing.assert_allclose(rec.vector, [1.0, 0, 0], atol=1e-6)
+    _load("kept", "v3", "m2", _loader(calls))
+    rec = client.retrieve("kept", [99], with_vectors=True)[0]
+    np.testing.assert_allclose(rec.vector, np.full(3, 3 ** -0.5), atol=1e-6)
+    assert client.retrieve("kept", [1], with_payload=True)[0].payload == {"fuente": True}
+
+# Si la carga falla, la coleccion vigente queda intacta
+def test_failed_load_keeps_live_collection():
+    calls = []
+    _load("safe", "v1", "m1", _loader(calls))
+
+    async def broken(collection):
+        raise RuntimeError("fuente rota")
+    with pytest.raises(RuntimeError):
+        _load("safe", "v2", "m1", broken)
+    assert physical_collection("safe") == calls[0]
+    assert client.count("safe").count == 1
+    assert acquire_ingest_lock("safe")
+    release_ingest_lock("safe")
+
+def test_ingest_lock_is_exclusive():
+    assert acquire_ingest_lock("locked")
+    assert not acquire_ingest_lock("locked")
+    release_ingest_lock("locked")
+    assert acquire_ingest_lock("locked")
+    release_ingest_lock("locked")
+
+# Para un ID que trae la fuente gana la fuente, aunque se haya escrito en runtime
+def test_source_wins_for_reingested_ids():
+    calls = []
+    _load("precedence", "v1", "m1", _loader(calls))
+    upsert_vectors("precedence", [1], np.array([[0, 3.0, 0]]), [{"runtime": True}])
+    _load("precedence", "v2", "m1", _loader(calls))
+    assert client.retrieve("precedence", [1], with_payload=True)[0].payload == {"fuente": True}
@@ -0,0 +1,19 @@
+import json
+import asyncio
+import numpy as np
+from app.services.qdrant_store import ensure_collection, upsert_vectors
+from app.utils.streaming import _json_chunks, parse_cursor
+
+async def _collect(collection, cursor, limit):
+    return json.loads("".join([c async for c in _json_chunks(collection, "items", cursor, limit)]))
+
+def test_streams_every_page_and_pages_with_cursor():
+    ensure_collection("streamed", 2)
+    upsert_vectors("streamed", list(range(1, 601)), np.ones((600, 2)), [{"ID": i} for i in range(1, 601)])
+    full = asyncio.run(_collect("streamed", None, None))
+    assert [p["ID"] for p in full["items"]] == list(range(1, 601))
+    assert full["next_cursor"] is None
+    page = asyncio.run(_collect("streamed", None, 300))
+    assert len(page["items"]) == 300 and page["next_cursor"] == 301
+    rest = asyncio.run(_collect("streamed", parse_cursor(str(page["next_cursor"])), 300))
+    assert rest["items"][0]["ID"] == 301 and len(rest["items"]) == 300
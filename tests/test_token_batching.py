@@ -0,0 +1,42 @@
+import numpy as np
+from app.services.token_batching import plan_batches, encode_bucketed
+
+def test_batches_respect_token_budget():
+    lengths = [10, 500, 12, 480, 11, 9]
+    batches = plan_batches(lengths, token_budget=900, max_batch=32)
+    # Los largos quedan juntos y los cortos juntos
+    assert batches == [[1], [3], [2, 4, 0, 5]]
+    for b in batches:
+        assert len(b) == 1 or len(b) * max(lengths[i] for i in b) <= 900
+
+def test_batches_cover_every_index_once():
+    lengths = [3, 7, 7, 1, 20, 5, 5, 5]
+    batches = plan_batches(lengths, token_budget=24, max_batch=3)
+    assert sorted(i for b in batches for i in b) == list(range(len(lengths)))
+    assert all(len(b) <= 3 for b in batches)
+
+# Modelo falso: un token por palabra; encode antepone un prompt como e5
+class FakeModel:
+    max_seq_length = 4
+
+    def __init__(self):
+        self.calls = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def tokenizer(self, texts, **kwargs):
+        return {"input_ids": [t.split() for t in texts]}
+
+    def encode(self, texts, batch_size, normalize_embeddings, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[len("query: " + t), t.count(" ")] for t in texts], dtype=np.float32)
+
+# Los lotes pasan por model.encode y el resultado vuelve en el orden original
+def test_encode_bucketed_matches_model_encode():
+    model = FakeModel()
+    texts = ["a", "a b c d e f", "a b", "a b c"]
+    emb, truncated = encode_bucketed(model, texts, normalize=True, token_budget=8, max_batch=32)
+    np.testing.assert_array_equal(emb, model.encode(texts, len(texts), True))
+    assert truncated == 1
+    assert model.calls[:-1] == [["a b c d e f", "a b c"], ["a b", "a"]]
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+import pytest
+from app.services.topic_engine import NumpyTopicEngine, load_torch_tensors
+from app.services.topics import transform_topics
+
+AYUDA = os.path.join(os.path.dirname(__file__), "..", "ayuda")
+
+def test_loads_artifacts_as_memmap():
+    tensors = load_torch_tensors(os.path.join(AYUDA, "topic_embeddings.bin"))
+    assert isinstance(tensors["topic_embeddings"], np.memmap)
+    engine = NumpyTopicEngine(AYUDA)
+    assert engine.topic_embeddings.shape[0] == len(engine.topic_labels)
+
+def test_transform_assigns_each_topic_to_itself():
+    engine = NumpyTopicEngine(AYUDA)
+    emb = engine.topic_embeddings[:5] * 3.0
+    topics, probs = engine.transform(["x"] * 5, embeddings=emb)
+    assert topics == [i - engine._outliers for i in range(5)]
+    np.testing.assert_allclose(np.diag(probs[:, :5]), 1.0, atol=1e-5)
+    out = transform_topics(engine, ["x"] * 5, embeddings=emb)
+    assert out.shape == (5, engine.topic_embeddings.shape[0] - 1)
+
+# Paridad con BERTopic.transform sobre los mismos embeddings
+def test_parity_with_bertopic():
+    bertopic = pytest.importorskip("bertopic")
+    reference = bertopic.BERTopic.load(AYUDA)
+    engine = NumpyTopicEngine(AYUDA)
+    emb = np.random.default_rng(0).normal(size=(64, engine.topic_embeddings.shape[1]))
+    docs = ["doc"] * len(emb)
+    ref_topics, ref_probs = reference.transform(docs, embeddings=emb)
+    topics, probs = engine.transform(docs, embeddings=emb)
+    np.testing.assert_allclose(probs, ref_probs, atol=1e-5)
+    assert list(topics) == list(ref_topics)
@@ -0,0 +1,60 @@
+import asyncio
+import numpy as np
+from app.services.embeddings_base import EmbeddingsProvider
+from app.services.topics import transform_topics, TopicInference, TopicVectorCache
+
+# Modelo de topicos falso: 1 columna de outliers + 3 topicos, cuenta las llamadas
+class FakeTopicModel:
+    def __init__(self):
+        self.calls = 0
+    def transform(self, docs, embeddings=None):
+        self.calls += 1
+        self.embeddings = embeddings
+        probs = np.array([[9.0, len(d), 1.0, 0.0] for d in docs])
+        return [0] * len(docs), probs
+
+def test_transform_topics_chunks_and_drops_outliers():
+    model = FakeTopicModel()
+    out = transform_topics(model, ["a", "bb", "ccc"], chunk_size=2)
+    assert model.calls == 2
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(out, [[1, 1, 0], [2, 1, 0], [3, 1, 0]])
+
+# Encoder falso que registra los textos codificados
+class FakeEncoder(EmbeddingsProvider):
+    model_name = "topic-encoder"
+    def __init__(self):
+        self.seen = []
+    async def embed_array(self, texts):
+        self.seen.extend(texts)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+def test_topic_inference_caches_and_invalidates():
+    model = FakeTopicModel()
+    topics = TopicInference(model, TopicVectorCache("v1", max_items=2), FakeEncoder())
+    first = asyncio.run(topics.vector("hola", owner=("ideas", 1)))
+    again = asyncio.run(topics.vector("hola"))
+    assert model.calls == 1
+    np.testing.assert_array_equal(first, again)
+    topics.invalidate(("ideas", 1))
+    asyncio.run(topics.vector("hola"))
+    assert model.calls == 2
+
+# Los duenos se olvidan cuando su entrada sale por LRU o cambia de texto
+def test_owners_are_pruned_on_eviction():
+    cache = TopicVectorCache("v1", max_items=2)
+    cache.put("a", np.zeros(2), owner=("ideas", 1))
+    cache.put("b", np.zeros(2), owner=("ideas", 2))
+    cache.put("b2", np.zeros(2), owner=("ideas", 2))
+    assert cache.stats()["owners"] == 1
+    cache.invalidate(("ideas", 2))
+    assert cache.get("b") is not None and cache.get("b2") is None
+
+def test_topic_inference_reuses_precomputed_embeddings():
+    model, encoder = FakeTopicModel(), FakeEncoder()
+    topics = TopicInference(model, TopicVectorCache("v1"), encoder)
+    emb = np.zeros(2, dtype=np.float32)
+    asyncio.run(topics.vector("ya codificado", embedding=emb))
+    asyncio.run(topics.vectors(["nuevo"]))
+    assert encoder.seen == ["nuevo"]
+    assert topics.shares_encoder(encoder)